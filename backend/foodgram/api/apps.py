@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class ApiConfig(AppConfig):
     name = "api"
+
+    def ready(self):
+        import api.signals  # noqa: F401
+
+        backend = settings.CACHES["default"]["BACKEND"]
+        if settings.WEB_CONCURRENCY > 1 and backend.endswith("LocMemCache"):
+            # Наборы связей, версии справочников, кэш ленты и закрепление
+            # за default живут в кэше: у каждого процесса он был бы свой.
+            raise ImproperlyConfigured(
+                "LocMemCache is per process, set CACHE_BACKEND to a shared "
+                "cache when WEB_CONCURRENCY is greater than 1"
+            )
@@ -0,0 +1,79 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.exceptions import NotFound
+
+from api import metrics
+from api.catalogue import catalogue_response, ingredient_catalogue, tag_catalogue
+from api.mixins import request_etag
+from api.search import search_ingredients
+
+
+def conditional_render(catalogue, render, query_params, etags):
+    """Версия справочника, метрики и рендеринг за один переход в поток."""
+    etag = quote_etag(request_etag(catalogue.version(), query_params, "json"))
+    if etag in etags or "*" in etags:
+        metrics.incr("conditional_get.hit")
+        return etag, None
+    metrics.incr("conditional_get.miss")
+    return etag, render()
+
+
+async def catalogue_view(request, catalogue, render):
+    """Ответ из справочника без обращения к ORM в цикле событий.
+
+    Кэш и база вызываются одним sync_to_async на запрос, поэтому
+    соединения с БД остаются в потоке запроса и закрываются штатными
+    сигналами.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(("GET", "HEAD"))
+    etags = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+    try:
+        etag, content = await sync_to_async(conditional_render)(
+            catalogue, render, request.GET, etags
+        )
+    except NotFound as exc:
+        return JsonResponse(
+            {"detail": exc.detail},
+            status=exc.status_code,
+            json_dumps_params={"ensure_ascii": False},
+        )
+    if content is None:
+        response = HttpResponseNotModified()
+    else:
+        response = catalogue_response(content)
+    response["ETag"] = etag
+    patch_vary_headers(response, ("Accept", "Authorization"))
+    return response
+
+
+async def tag_list(request):
+    return await catalogue_view(
+        request, tag_catalogue, lambda: tag_catalogue.state().render()
+    )
+
+
+async def tag_detail(request, pk):
+    return await catalogue_view(
+        request, tag_catalogue, lambda: tag_catalogue.state().get(pk)
+    )
+
+
+async def ingredient_list(request):
+    name = request.GET.get("name")
+
+    def render():
+        catalogue = ingredient_catalogue.state()
+        if name:
+            return catalogue.render(search_ingredients(name))
+        return catalogue.render()
+
+    return await catalogue_view(request, ingredient_catalogue, render)
+
+
+async def ingredient_detail(request, pk):
+    return await catalogue_view(
+        request, ingredient_catalogue, lambda: ingredient_catalogue.state().get(pk)
+    )
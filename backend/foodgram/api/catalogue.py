@@ -0,0 +1,108 @@
+import bisect
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Tag
+
+from api.serializers import IngredientSerializer, TagSerializer
+
+
+class CatalogueState:
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = rows
+        self.ids = [row["id"] for row in rows]
+        renderer = JSONRenderer()
+        self.by_id = {row["id"]: renderer.render(row) for row in rows}
+        index = sorted((row["name"].lower(), row["id"]) for row in rows)
+        self.names = [name for name, _ in index]
+        self.sorted_ids = [pk for _, pk in index]
+
+    def get(self, pk):
+        try:
+            return self.by_id[int(pk)]
+        except (KeyError, TypeError, ValueError):
+            raise NotFound()
+
+    def render(self, ids=None):
+        if ids is None:
+            ids = self.ids
+        return b"[" + b",".join(self.by_id[pk] for pk in ids if pk in self.by_id) + b"]"
+
+    def search(self, value, limit):
+        names, ids = self.names, self.sorted_ids
+        start = bisect.bisect_left(names, value)
+        end = bisect.bisect_left(names, value + "\U0010ffff", lo=start)
+        found = ids[start:min(end, start + limit)]
+        if len(found) == limit:
+            return found
+        for position, name in enumerate(names):
+            if value in name and not start <= position < end:
+                found.append(ids[position])
+                if len(found) == limit:
+                    break
+        return found
+
+
+class Catalogue:
+    """Справочник, сериализованный в JSON и закэшированный в памяти процесса.
+
+    Версия хранится в кэше Django, поэтому изменение справочника в одном
+    процессе сбрасывает копии во всех остальных.
+    """
+
+    def __init__(self, queryset, serializer_class, version_key):
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self.version_key = version_key
+        self._lock = threading.Lock()
+        self._state = None
+
+    def bump(self):
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    def version(self):
+        version = cache.get(self.version_key)
+        if version is not None:
+            return version
+        cache.add(self.version_key, uuid.uuid4().hex, None)
+        return cache.get(self.version_key)
+
+    def state(self):
+        version = self.version()
+        state = self._state
+        if state is not None and state.version == version:
+            return state
+        with self._lock:
+            state = self._state
+            if state is not None and state.version == version:
+                return state
+            # Новая версия читается с default: реплика может отставать,
+            # а копия в памяти живёт до следующего изменения справочника.
+            rows = self.serializer_class(
+                self.queryset.using("default"), many=True
+            ).data
+            self._state = CatalogueState(version, rows)
+            return self._state
+
+
+def catalogue_response(content):
+    return HttpResponse(content, content_type="application/json")
+
+
+ingredient_catalogue = Catalogue(
+    Ingredient.objects.all(), IngredientSerializer, "catalogue:ingredients"
+)
+
+tag_catalogue = Catalogue(Tag.objects.all(), TagSerializer, "catalogue:tags")
+
+
+def tag_ids_by_slug():
+    return {
+        row["slug"]: row["id"] for row in tag_catalogue.state().rows if row["slug"]
+    }
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import OperationalError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.views import exception_handler as drf_exception_handler
+
+
+class DatabaseBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Database is busy, retry later."
+    default_code = "database_busy"
+
+
+def exception_handler(exc, context):
+    """Исчерпанный пул соединений отвечает 503 с Retry-After вместо 500."""
+    if settings.DB_POOL_MODE == "pool" and isinstance(exc, OperationalError):
+        from foodgram.db.pooled.base import PoolTimeout
+
+        if isinstance(exc.__cause__, PoolTimeout):
+            response = drf_exception_handler(DatabaseBusy(), context)
+            response["Retry-After"] = "1"
+            return response
+    return drf_exception_handler(exc, context)
@@ -0,0 +1,52 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api import metrics
+
+PREFIX = "feed:"
+
+metrics.register("feed_cache.hit", "feed_cache.miss")
+
+
+def tag_key(tag):
+    return f"{PREFIX}tag:{tag}"
+
+
+def tag_versions(tags):
+    """Версии тегов; отсутствующие создаются атомарно через add."""
+    keys = [tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*tags):
+    cache.delete_many([tag_key(tag) for tag in tags])
+
+
+def make_key(request, tags, *parts):
+    """Ключ ответа: хост, путь, упорядоченные параметры и версии тегов."""
+    params = sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists()
+    )
+    source = repr(
+        (request.get_host(), request.path, params, tag_versions(tags), parts)
+    )
+    return PREFIX + hashlib.md5(source.encode()).hexdigest()
+
+
+def get(key):
+    entry = cache.get(key)
+    metrics.incr("feed_cache.hit" if entry is not None else "feed_cache.miss")
+    return entry
+
+
+def store(key, entry):
+    cache.set(key, entry, settings.RECIPE_FEED_CACHE_TIMEOUT)
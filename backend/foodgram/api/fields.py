@@ -0,0 +1,67 @@
+import base64
+import binascii
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from rest_framework import serializers
+
+from recipes.images import get_executor, process_upload, rendition_url
+
+
+def image_url(recipe, size, request=None):
+    url = rendition_url(recipe, size)
+    if url and request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class RenditionImageField(serializers.Field):
+    """Ссылка на уменьшенную копию изображения рецепта."""
+
+    def __init__(self, size="card", **kwargs):
+        self.size = size
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return image_url(recipe, self.size, self.context.get("request"))
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    """Изображение в base64, декодируемое частями во временный файл.
+
+    Размер проверяется до декодирования, а проверка и пересохранение
+    изображения выполняются в отдельном пуле потоков.
+    """
+
+    chunk_size = 64 * 1024
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) or not data:
+            self.fail("invalid")
+        if data.startswith("data:"):
+            data = data.partition(";base64,")[2]
+        if len(data) * 3 // 4 > settings.RECIPE_IMAGE_MAX_BYTES:
+            raise serializers.ValidationError(
+                f"Image is larger than {settings.RECIPE_IMAGE_MAX_BYTES} bytes"
+            )
+        with tempfile.TemporaryFile() as decoded:
+            try:
+                for start in range(0, len(data), self.chunk_size):
+                    decoded.write(
+                        base64.b64decode(
+                            data[start:start + self.chunk_size], validate=True
+                        )
+                    )
+            except (binascii.Error, ValueError):
+                self.fail("invalid_image")
+            executor = get_executor("uploads", settings.RECIPE_IMAGE_UPLOAD_WORKERS)
+            try:
+                result, extension = executor.submit(process_upload, decoded).result(
+                    timeout=settings.RECIPE_IMAGE_UPLOAD_TIMEOUT
+                )
+            except Exception:
+                self.fail("invalid_image")
+        return File(result, name=f"{uuid.uuid4()}.{extension}")
@@ -1,30 +1,74 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from django_filters import AllValuesMultipleFilter
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
 
-from recipes.models import Ingredient
+from recipes.models import Favorite, Recipe, ShoppingList
 
+from api.catalogue import tag_ids_by_slug
+from api.search import search_recipes
 
-class IngredientFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr="istartswith")
 
-    class Meta:
-        model = Ingredient
-        fields = ("name",)
+def tag_choices():
+    return [(slug, slug) for slug in tag_ids_by_slug()]
 
 
 class RecipeFilter(FilterSet):
-    tags = AllValuesMultipleFilter(field_name="tags__slug", label="tags")
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method="tags_filter", label="tags"
+    )
     is_favorited = filters.BooleanFilter(method="is_favorited_filter")
     is_in_shopping_cart = filters.BooleanFilter(method="is_in_shopping_cart_filter")
 
+    def tags_filter(self, queryset, name, value):
+        if not value:
+            return queryset
+        slugs = tag_ids_by_slug()
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef("pk"),
+                    tag_id__in=[slugs[slug] for slug in value if slug in slugs],
+                )
+            )
+        )
+
     def is_favorited_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(recipe_fav__user=user)
+            return queryset.filter(
+                Exists(Favorite.objects.filter(user=user, recipe=OuterRef("pk")))
+            )
         return queryset
 
     def is_in_shopping_cart_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(recipe_basket__user=user)
+            return queryset.filter(
+                Exists(ShoppingList.objects.filter(user=user, recipe=OuterRef("pk")))
+            )
         return queryset
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    tiebreaker = ("-pub_date", "-id")
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        fields = {field.lstrip("-") for field in ordering}
+        return [*ordering, *(
+            field for field in self.tiebreaker if field.lstrip("-") not in fields
+        )]
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """?search= по названию, описанию и ингредиентам с ранжированием."""
+
+    search_param = "search"
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(self.search_param, "").strip()
+        if not value:
+            return queryset
+        return search_recipes(queryset, value)
@@ -0,0 +1,69 @@
+from django.core.cache import cache
+
+PREFIX = "metrics:"
+
+COUNTERS = []
+
+
+def register(*names):
+    for name in names:
+        if name not in COUNTERS:
+            COUNTERS.append(name)
+
+
+def incr(name, delta=1):
+    key = PREFIX + name
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def snapshot():
+    values = cache.get_many([PREFIX + name for name in COUNTERS])
+    return {name: values.get(PREFIX + name, 0) for name in COUNTERS}
+
+
+HISTOGRAMS_KEY = PREFIX + "histograms"
+
+known_histograms = set()
+
+
+def observe(name, value, bounds):
+    """Добавляет значение в гистограмму с верхними границами bounds."""
+    bucket = next((bound for bound in bounds if value <= bound), "inf")
+    if name not in known_histograms:
+        names = cache.get(HISTOGRAMS_KEY, {})
+        if names.get(name) != bounds:
+            names[name] = bounds
+            cache.set(HISTOGRAMS_KEY, names, None)
+        known_histograms.add(name)
+    incr(f"hist:{name}:{bucket}")
+    incr(f"hist:{name}:count")
+    incr(f"hist:{name}:sum", int(value * 1000))
+
+
+def histograms():
+    names = cache.get(HISTOGRAMS_KEY, {})
+    keys = [
+        f"{PREFIX}hist:{name}:{suffix}"
+        for name, bounds in names.items()
+        for suffix in (*bounds, "inf", "count", "sum")
+    ]
+    values = cache.get_many(keys)
+    result = {}
+    for name, bounds in sorted(names.items()):
+
+        def value(suffix):
+            return values.get(f"{PREFIX}hist:{name}:{suffix}", 0)
+
+        count = value("count")
+        result[name] = {
+            "count": count,
+            "mean": round(value("sum") / 1000 / count, 3) if count else 0,
+            "buckets": {
+                f"le_{bound}": value(bound) for bound in (*bounds, "inf")
+            },
+        }
+    return result
@@ -0,0 +1,209 @@
+import asyncio
+import functools
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+from api import metrics
+
+logger = logging.getLogger(__name__)
+
+MS_BOUNDS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUERY_BOUNDS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BOUNDS = (1024, 10240, 102400, 1048576)
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+def endpoint_name(request, view_func):
+    """Имя действия: ViewSet.action, APIView.method или имя функции."""
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return f"{view_func.__module__}.{view_func.__name__}"
+    actions = getattr(view_func, "actions", None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f"{view_class.__name__}.{action}"
+
+
+def instrumentation_state(request):
+    """Состояние замера запроса или None, если запрос не попал в выборку."""
+    return getattr(request, "instrumentation", None)
+
+
+@functools.lru_cache(maxsize=None)
+def timed_class(serializer_class):
+    def data(self):
+        state = self._instrumentation
+        db = state["timer"].duration
+        started = time.perf_counter()
+        try:
+            return serializer_class.data.fget(self)
+        finally:
+            state["serialize"] += (
+                time.perf_counter() - started - (state["timer"].duration - db)
+            )
+
+    return type(
+        serializer_class.__name__,
+        (serializer_class,),
+        {"__module__": serializer_class.__module__, "data": property(data)},
+    )
+
+
+def timed_serializer(serializer, request):
+    """Замеряет serializer.data верхнего сериализатора ответа.
+
+    Вложенные сериализаторы и элементы many=True входят в одно значение
+    serialize, из которого вычитаются запросы к БД во время сериализации.
+    """
+    state = instrumentation_state(request)
+    if state is not None:
+        serializer._instrumentation = state
+        serializer.__class__ = timed_class(type(serializer))
+    return serializer
+
+
+@sync_and_async_middleware
+class InstrumentationMiddleware:
+    """Число запросов к БД, время БД, сериализации, приложения и рендеринга.
+
+    Замеряется доля запросов API_INSTRUMENTATION_SAMPLE_RATE: для них
+    отдаётся заголовок Server-Timing, а значения попадают в гистограммы
+    эндпоинта метрик и в лог. Потоковые ответы выполняют запросы уже после
+    выхода из middleware, поэтому они замеряются до закрытия потока и
+    записываются без заголовка. Сериализацию и рендеринг замеряют
+    представления через InstrumentedViewMixin.
+
+    Middleware работает и под WSGI, и под ASGI без переключения потоков.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # По этой отметке Django вызывает экземпляр как корутину.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = self.start(request)
+        if state is None:
+            return self.get_response(request)
+        with ExitStack() as stack:
+            self.wrap_connections(stack, state["timer"])
+            response = self.get_response(request)
+        return self.finish(request, state, response)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        if state is None:
+            return await self.get_response(request)
+        with ExitStack() as stack:
+            self.wrap_connections(stack, state["timer"])
+            response = await self.get_response(request)
+        return self.finish(request, state, response)
+
+    @staticmethod
+    def start(request):
+        rate = settings.API_INSTRUMENTATION_SAMPLE_RATE
+        if rate <= 0 or random.random() >= rate:
+            return None
+        request.instrumentation = state = {
+            "started": time.perf_counter(),
+            "timer": QueryTimer(),
+            "serialize": 0.0,
+            "render_started": None,
+        }
+        return state
+
+    def finish(self, request, state, response):
+        match = request.resolver_match
+        if match is None:
+            return response
+        state["endpoint"] = endpoint_name(request, match.func)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, state, response
+            )
+            return response
+        size = len(response.content)
+        self.record(state, response, time.perf_counter() - state["started"], size)
+        return response
+
+    @staticmethod
+    def wrap_connections(stack, timer):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+
+    def stream(self, content, state, response):
+        size = 0
+        try:
+            with ExitStack() as stack:
+                self.wrap_connections(stack, state["timer"])
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.record(
+                state, response, time.perf_counter() - state["started"], size
+            )
+
+    def record(self, state, response, total, size):
+        timer = state["timer"]
+        render = 0.0
+        if state.get("render") is not None:
+            render = state["render"] - state["render_started"]
+        db = timer.duration
+        serialize = state["serialize"]
+        app = max(total - db - serialize - render, 0.0)
+        timings = {
+            "db": db * 1000,
+            "serialize": serialize * 1000,
+            "app": app * 1000,
+            "render": render * 1000,
+        }
+        if not response.streaming:
+            response["Server-Timing"] = ", ".join(
+                [f'db;dur={timings["db"]:.1f};desc="{timer.count} queries"']
+                + [
+                    f"{name};dur={timings[name]:.1f}"
+                    for name in ("serialize", "app", "render")
+                ]
+                + [f"total;dur={total * 1000:.1f}"]
+            )
+        endpoint = state["endpoint"]
+        metrics.observe(f"{endpoint}.queries", timer.count, QUERY_BOUNDS)
+        for name, value in timings.items():
+            metrics.observe(f"{endpoint}.{name}_ms", value, MS_BOUNDS)
+        metrics.observe(f"{endpoint}.total_ms", total * 1000, MS_BOUNDS)
+        metrics.observe(f"{endpoint}.bytes", size, BYTES_BOUNDS)
+        logger.info(
+            "%s %s queries=%d db=%.1fms serialize=%.1fms app=%.1fms "
+            "render=%.1fms bytes=%d",
+            endpoint,
+            response.status_code,
+            timer.count,
+            timings["db"],
+            timings["serialize"],
+            timings["app"],
+            timings["render"],
+            size,
+        )
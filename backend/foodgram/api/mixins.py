@@ -0,0 +1,137 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import permissions, status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from foodgram.db.router import use_replica
+
+from api import metrics
+from api.middleware import instrumentation_state, timed_serializer
+
+metrics.register("conditional_get.hit", "conditional_get.miss")
+
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+
+
+def make_etag(*parts):
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def request_etag(version, query_params, renderer_format):
+    """ETag ответа: версия данных, упорядоченные параметры и формат."""
+    params = sorted((name, sorted(values)) for name, values in query_params.lists())
+    return make_etag(version, params, renderer_format)
+
+
+class ConditionalGetMixin:
+    """ETag для list и retrieve.
+
+    ETag считается до сериализации, поэтому совпавший If-None-Match сразу
+    превращается в ответ 304. Версию данных отдаёт get_etag_version,
+    параметры запроса и формат ответа добавляются к ней здесь.
+    """
+
+    conditional_actions = ("list", "retrieve")
+
+    def get_etag_version(self, request):
+        """Версия данных ответа или None, если ответ не кэшируется."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag_version = self.etag = None
+        if request.method not in ("GET", "HEAD"):
+            return
+        if self.action not in self.conditional_actions:
+            return
+        self.etag_version = self.get_etag_version(request)
+        if self.etag_version is None:
+            return
+        self.etag = request_etag(
+            self.etag_version, request.query_params, request.accepted_renderer.format
+        )
+        etags = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+        if quote_etag(self.etag) in etags or "*" in etags:
+            metrics.incr("conditional_get.hit")
+            raise NotModified()
+        metrics.incr("conditional_get.miss")
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, "etag", None)
+        if etag and response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            response["ETag"] = quote_etag(etag)
+            patch_vary_headers(response, ("Accept", "Authorization"))
+        return response
+
+
+class ReplicaRoutingMixin:
+    """Безопасные запросы читают с реплики, изменения закрепляют default.
+
+    После успешного изменения пользователь REPLICA_STICKY_SECONDS секунд
+    читает с default и видит свои записи, даже если реплика отстаёт.
+    Аутентификация всегда выполняется на default.
+    """
+
+    @staticmethod
+    def pin_key(user):
+        return f"replica:pin:{user.pk}"
+
+    def dispatch(self, request, *args, **kwargs):
+        token = use_replica.set(False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            use_replica.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        if settings.DATABASE_REPLICAS and request.method in permissions.SAFE_METHODS:
+            user = request.user
+            if not user.is_authenticated or not cache.get(self.pin_key(user)):
+                use_replica.set(True)
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method not in permissions.SAFE_METHODS
+            and request.user.is_authenticated
+            and response.status_code < 400
+        ):
+            cache.set(
+                self.pin_key(request.user), True, settings.REPLICA_STICKY_SECONDS
+            )
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class InstrumentedViewMixin:
+    """Время serializer.data и рендеринга для InstrumentationMiddleware."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        return timed_serializer(serializer, self.request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        state = instrumentation_state(request)
+        if state is not None and hasattr(response, "add_post_render_callback"):
+            state["render_started"] = time.perf_counter()
+            response.add_post_render_callback(
+                lambda response: state.update(render=time.perf_counter())
+            )
+        return response
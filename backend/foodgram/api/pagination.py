@@ -0,0 +1,133 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """Постраничная выдача с опциональным keyset-режимом.
+
+    Без параметра cursor работает как PageNumberPagination. С ?cursor=
+    страницы выбираются условием по порядку запроса (ordering, ранг поиска),
+    а без него по keyset_ordering, вместо OFFSET. COUNT(*) выполняется
+    только по запросу ?count=true.
+    """
+
+    page_size_query_param = "limit"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    keyset_ordering = ("id",)
+    invalid_cursor_message = "Invalid cursor"
+    invalid_ordering_message = "This ordering is not supported with cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.keyset_count = None
+        if request.query_params.get(self.count_query_param) in ("1", "true"):
+            self.keyset_count = queryset.count()
+        ordering = self.get_keyset_ordering(queryset)
+        fields = [
+            (
+                name.lstrip("-"),
+                self.get_field(queryset, name.lstrip("-")),
+                name.startswith("-"),
+            )
+            for name in ordering
+        ]
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(
+                self.position_filter(fields, self.decode_cursor(cursor, fields))
+            )
+        page_size = self.get_page_size(request)
+        page = list(queryset.order_by(*ordering)[: page_size + 1])
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(page[-1], fields)
+        return page
+
+    def get_keyset_ordering(self, queryset):
+        """Порядок фильтров запроса, дополненный id для однозначности."""
+        ordering = list(queryset.query.order_by)
+        if not ordering:
+            return self.keyset_ordering
+        if not all(isinstance(name, str) for name in ordering):
+            raise ValidationError({"ordering": self.invalid_ordering_message})
+        if ordering[-1].lstrip("-") not in ("id", "pk"):
+            ordering.append("-id" if ordering[-1].startswith("-") else "id")
+        return ordering
+
+    def get_field(self, queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        try:
+            return queryset.model._meta.get_field(
+                "id" if name == "pk" else name
+            )
+        except FieldDoesNotExist:
+            raise ValidationError({"ordering": self.invalid_ordering_message})
+
+    def position_filter(self, fields, values):
+        condition = Q()
+        equal = {}
+        for (name, _, descending), value in zip(fields, values):
+            lookup = "lt" if descending else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def encode_cursor(self, obj, fields):
+        values = [
+            # У аннотаций нет attname, их значения уже сериализуемы.
+            field.value_to_string(obj) if hasattr(field, "attname")
+            else getattr(obj, name)
+            for name, field, _ in fields
+        ]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor, fields):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(fields):
+                raise ValueError
+            return [
+                field.to_python(value) for (_, field, _), value in zip(fields, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "count": self.keyset_count,
+                "next": self.get_next_link(),
+                "previous": None,
+                "results": data,
+            }
+        )
+
+
+class RecipePagination(KeysetPagination):
+    keyset_ordering = ("-pub_date", "-id")
@@ -0,0 +1,130 @@
+import bisect
+import zlib
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram.db.transaction import on_commit_once
+from recipes.models import Favorite, ShoppingList
+from users.models import Subscribe
+
+from api import metrics
+
+PREFIX = "relations:"
+
+SOURCES = {
+    "favorites": (Favorite, "recipe_id"),
+    "cart": (ShoppingList, "recipe_id"),
+    "subscriptions": (Subscribe, "author_id"),
+}
+
+metrics.register("relations.hit", "relations.miss")
+
+
+class IdSet:
+    """Отсортированный массив id: 8 байт на запись и поиск делением пополам."""
+
+    __slots__ = ("ids",)
+
+    def __init__(self, ids=()):
+        self.ids = array("q", sorted(ids))
+
+    @classmethod
+    def from_bytes(cls, data):
+        id_set = cls()
+        id_set.ids.frombytes(data)
+        return id_set
+
+    def to_bytes(self):
+        return self.ids.tobytes()
+
+    def fingerprint(self):
+        return len(self.ids), zlib.crc32(self.ids)
+
+    def __contains__(self, pk):
+        ids = self.ids
+        index = bisect.bisect_left(ids, pk)
+        return index < len(ids) and ids[index] == pk
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def cache_key(user_id, kind):
+    return f"{PREFIX}{kind}:{user_id}"
+
+
+def load(user_id, kind):
+    model, field = SOURCES[kind]
+    return IdSet(
+        model.objects.filter(user_id=user_id).values_list(field, flat=True)
+    )
+
+
+def refresh(user_id, kind):
+    id_set = load(user_id, kind)
+    cache.set(
+        cache_key(user_id, kind), id_set.to_bytes(), settings.RELATIONS_CACHE_TIMEOUT
+    )
+    return id_set
+
+
+def changed(user_id, kind):
+    """Перечитывает набор после коммита изменившей его транзакции."""
+    on_commit_once(("relations", user_id, kind), lambda: refresh(user_id, kind))
+
+
+class UserRelations:
+    """Id избранных рецептов, рецептов в корзине и авторов в подписках.
+
+    Каждый набор загружается один раз за запрос: из общего кэша,
+    а при промахе из базы.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.sets = {}
+
+    def get(self, kind):
+        if kind not in self.sets:
+            self.sets[kind] = self.fetch(kind)
+        return self.sets[kind]
+
+    def fetch(self, kind):
+        if self.user_id is None:
+            return IdSet()
+        data = cache.get(cache_key(self.user_id, kind))
+        if data is not None:
+            metrics.incr("relations.hit")
+            return IdSet.from_bytes(data)
+        metrics.incr("relations.miss")
+        return refresh(self.user_id, kind)
+
+    @property
+    def favorites(self):
+        return self.get("favorites")
+
+    @property
+    def cart(self):
+        return self.get("cart")
+
+    @property
+    def subscriptions(self):
+        return self.get("subscriptions")
+
+    def fingerprint(self):
+        return [self.get(kind).fingerprint() for kind in SOURCES]
+
+
+def relations_for(request):
+    """Связи пользователя, закэшированные на объекте запроса."""
+    if request is None:
+        return UserRelations(None)
+    user = request.user
+    request = getattr(request, "_request", request)
+    relations = getattr(request, "user_relations", None)
+    if relations is None:
+        relations = UserRelations(user.pk if user.is_authenticated else None)
+        request.user_relations = relations
+    return relations
@@ -0,0 +1,187 @@
+import bisect
+import heapq
+import re
+import threading
+from collections import defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Func, Max, Value, When
+from django.db.models.functions import Lower
+
+from recipes.models import Ingredient, Recipe
+
+from api.catalogue import ingredient_catalogue
+
+
+def database_search(value, limit):
+    queryset = Ingredient.objects.annotate(name_lower=Lower("name")).order_by(
+        "name_lower"
+    )
+    found = list(
+        queryset.filter(name_lower__startswith=value).values_list("pk", flat=True)[
+            :limit
+        ]
+    )
+    if len(found) < limit:
+        found += queryset.filter(name_lower__contains=value).exclude(
+            name_lower__startswith=value
+        ).values_list("pk", flat=True)[: limit - len(found)]
+    return found
+
+
+def search_ingredients(value):
+    """Id ингредиентов: сначала совпадения по началу названия, затем по вхождению."""
+    value = value.lower()
+    limit = settings.INGREDIENT_SEARCH_LIMIT
+    backend = settings.INGREDIENT_SEARCH_BACKEND
+    if backend == "auto":
+        backend = "memory" if connection.vendor == "sqlite" else "database"
+    if backend == "memory":
+        return ingredient_catalogue.state().search(value, limit)
+    return database_search(value, limit)
+
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class RecipeSearchIndex:
+    """Инвертированный индекс search_document для баз без полнотекстового поиска.
+
+    Перед поиском дочитываются рецепты с updated_at не раньше последнего
+    загруженного; если рецептов стало меньше, индекс строится заново.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.postings = defaultdict(list)
+        self.documents = {}
+        self.tokens = []
+        self.tokens_sorted = True
+        self.state = (0, None)
+
+    def refresh(self):
+        recipes = Recipe.objects.using("default")
+        aggregate = recipes.aggregate(count=Count("id"), last=Max("updated_at"))
+        state = (aggregate["count"], aggregate["last"])
+        if state == self.state:
+            return
+        if state[0] < len(self.documents):
+            self.reset()
+        if self.state[1] is not None:
+            recipes = recipes.filter(updated_at__gte=self.state[1])
+        for pk, document in recipes.values_list("pk", "search_document").iterator():
+            self.replace(pk, document)
+        self.state = state
+
+    def replace(self, pk, document):
+        for token in self.documents.pop(pk, ()):
+            self.postings[token].remove(pk)
+        tokens = tuple(set(tokenize(document)))
+        for token in tokens:
+            if token not in self.postings:
+                self.tokens_sorted = False
+            self.postings[token].append(pk)
+        self.documents[pk] = tokens
+
+    def search(self, value, limit):
+        """Рецепты, где каждое слово запроса начинает какое-то слово документа.
+
+        Точное совпадение слова весит 2, совпадение по началу слова 1.
+        """
+        terms = tokenize(value)
+        if not terms:
+            return {}
+        with self.lock:
+            self.refresh()
+            if not self.tokens_sorted:
+                self.tokens = sorted(
+                    token for token, pks in self.postings.items() if pks
+                )
+                self.tokens_sorted = True
+            scores = None
+            for term in terms:
+                matches = defaultdict(int)
+                index = bisect.bisect_left(self.tokens, term)
+                while index < len(self.tokens) and self.tokens[index].startswith(
+                    term
+                ):
+                    token = self.tokens[index]
+                    weight = 2 if token == term else 1
+                    for pk in self.postings[token]:
+                        matches[pk] += weight
+                    index += 1
+                if scores is not None:
+                    matches = {
+                        pk: score + scores[pk]
+                        for pk, score in matches.items()
+                        if pk in scores
+                    }
+                scores = matches
+                if not scores:
+                    return {}
+        return dict(heapq.nlargest(limit, scores.items(), key=itemgetter(1)))
+
+
+recipe_index = RecipeSearchIndex()
+
+
+class RecipeSearchVector(Func):
+    """Выражение, совпадающее с GIN-индексом recipes_recipe_search_idx."""
+
+    template = "to_tsvector('russian'::regconfig, %(expressions)s)"
+
+
+def database_recipe_search(queryset, value):
+    from django.contrib.postgres.search import (
+        SearchQuery,
+        SearchRank,
+        SearchVectorField,
+    )
+
+    vector = RecipeSearchVector(
+        F("search_document"), output_field=SearchVectorField()
+    )
+    query = SearchQuery(value, config="russian")
+    return queryset.annotate(search_vector=vector).filter(
+        search_vector=query
+    ).annotate(rank=SearchRank(vector, query))
+
+
+def memory_recipe_search(queryset, value):
+    scores = recipe_index.search(value, settings.RECIPE_SEARCH_LIMIT)
+    if not scores:
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField())).none()
+    ids_by_score = defaultdict(list)
+    for pk, score in scores.items():
+        ids_by_score[score].append(pk)
+    return queryset.filter(pk__in=list(scores)).annotate(
+        rank=Case(
+            *[
+                When(pk__in=ids, then=Value(float(score)))
+                for score, ids in ids_by_score.items()
+            ],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    )
+
+
+def search_recipes(queryset, value):
+    """Рецепты по запросу, от более релевантных к менее релевантным."""
+    backend = settings.RECIPE_SEARCH_BACKEND
+    if backend == "auto":
+        backend = "database" if connection.vendor == "postgresql" else "memory"
+    if backend == "database":
+        queryset = database_recipe_search(queryset, value)
+    else:
+        queryset = memory_recipe_search(queryset, value)
+    return queryset.order_by("-rank", "-pub_date", "-id")
@@ -1,11 +1,24 @@
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from recipes.models import Favorite, Ingredient, IngredRecipe, Recipe, ShoppingList, Tag
+from recipes.images import schedule_renditions
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredRecipe,
+    Recipe,
+    ShoppingCartTotal,
+    ShoppingList,
+    Tag,
+)
 from users.models import Subscribe, User
 
+from api.fields import RenditionImageField, StreamingBase64ImageField, image_url
+from api.relations import relations_for
+
 
 class UserReadSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
@@ -22,10 +35,7 @@ class UserReadSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get("request")
-        if request and not request.user.is_anonymous:
-            return Subscribe.objects.filter(user=request.user, author=obj).exists()
-        return False
+        return obj.pk in relations_for(self.context.get("request")).subscriptions
 
 
 class RegistrationSerializer(UserCreateSerializer):
@@ -99,7 +109,7 @@ class EngredientAmountSerializer(serializers.ModelSerializer):
 class RecipeReadSerializer(serializers.ModelSerializer):
     tags = TagSerializer(read_only=True, many=True)
     author = UserReadSerializer(read_only=True)
-    image = Base64ImageField()
+    image = serializers.SerializerMethodField()
     ingredients = EngredientAmountSerializer(many=True, source="recipe")
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
@@ -117,21 +127,19 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             "image",
             "text",
             "cooking_time",
+            "favorites_count",
         )
 
+    def get_image(self, obj):
+        view = self.context.get("view")
+        size = "card" if view is not None and view.action == "list" else "detail"
+        return image_url(obj, size, self.context.get("request"))
+
     def get_is_favorited(self, obj):
-        request = self.context.get("request")
-        return (
-            request.user.is_authenticated
-            and Favorite.objects.filter(user=request.user, recipe=obj).exists()
-        )
+        return obj.pk in relations_for(self.context.get("request")).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get("request")
-        return (
-            request.user.is_authenticated
-            and ShoppingList.objects.filter(user=request.user, recipe=obj).exists()
-        )
+        return obj.pk in relations_for(self.context.get("request")).cart
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
@@ -149,7 +157,7 @@ class AddIngredientSerializer(serializers.ModelSerializer):
 class RecipeWriteSerializer(serializers.ModelSerializer):
     ingredients = AddIngredientSerializer(many=True)
     author = serializers.PrimaryKeyRelatedField(read_only=True)
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -163,18 +171,63 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             "cooking_time",
         )
 
+    def validate_ingredients(self, ingredients):
+        ids = [ingredient.get("id") for ingredient in ingredients]
+        if len(ids) != len(set(ids)):
+            raise ValidationError("Ingredients must be unique")
+        missing = set(ids) - set(Ingredient.objects.in_bulk(ids))
+        if missing:
+            raise ValidationError(f"Ingredients not found: {sorted(missing)}")
+        return ingredients
+
     def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            IngredRecipe.objects.bulk_create(
-                [
+        IngredRecipe.objects.bulk_create(
+            [
+                IngredRecipe(
+                    recipe=recipe,
+                    ingredient_id=ingredient.get("id"),
+                    amount=ingredient.get("amount"),
+                )
+                for ingredient in ingredients
+            ]
+        )
+
+    def update_ingredients(self, ingredients, recipe):
+        """Меняет только отличающиеся строки состава.
+
+        Удаление строк пересчитывает итоги корзин сигналами, а bulk-операции
+        сигналов не отправляют, поэтому их разница переносится явно.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in IngredRecipe.objects.filter(recipe=recipe)
+        }
+        amounts = {
+            ingredient.get("id"): ingredient.get("amount")
+            for ingredient in ingredients
+        }
+        IngredRecipe.objects.filter(
+            recipe=recipe, ingredient_id__in=current.keys() - amounts.keys()
+        ).delete()
+        created, changed, deltas = [], [], {}
+        for ingredient_id, amount in amounts.items():
+            row = current.get(ingredient_id)
+            if row is None:
+                created.append(
                     IngredRecipe(
-                        recipe=recipe,
-                        ingredient_id=ingredient.get("id"),
-                        amount=ingredient.get("amount"),
+                        recipe=recipe, ingredient_id=ingredient_id, amount=amount
                     )
-                ]
-            )
-
+                )
+                deltas[ingredient_id] = amount
+            elif row.amount != amount:
+                deltas[ingredient_id] = amount - row.amount
+                row.amount = amount
+                changed.append(row)
+        IngredRecipe.objects.bulk_create(created)
+        IngredRecipe.objects.bulk_update(changed, ["amount"])
+        ShoppingCartTotal.objects.change_recipe(recipe, deltas)
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop("ingredients")
         tags = validated_data.pop("tags")
@@ -183,18 +236,28 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         )
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        schedule_renditions(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if "ingredients" in validated_data:
-            ingredients = validated_data.pop("ingredients")
-            instance.ingredients.clear()
-            self.create_ingredients(ingredients, instance)
+            self.update_ingredients(validated_data.pop("ingredients"), instance)
         if "tags" in validated_data:
             instance.tags.set(validated_data.pop("tags"))
+        if "image" in validated_data:
+            validated_data["image_renditions"] = {}
+            instance = super().update(instance, validated_data)
+            schedule_renditions(instance)
+            return instance
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            "tags",
+            Prefetch("recipe", queryset=IngredRecipe.objects.select_related("ingredient")),
+        )
         return RecipeReadSerializer(
             instance, context={"request": self.context.get("request")}
         ).data
@@ -203,7 +266,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 class ShoppingListSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source="recipe.id")
     name = serializers.ReadOnlyField(source="recipe.name")
-    image = serializers.ImageField(source="recipe.image", read_only=True)
+    image = RenditionImageField(source="recipe")
     cooking_time = serializers.ReadOnlyField(source="recipe.cooking_time")
 
     class Meta:
@@ -218,10 +281,7 @@ class FavoriteSerializer(serializers.ModelSerializer):
     name = serializers.ReadOnlyField(
         source="recipe.name",
     )
-    image = Base64ImageField(
-        source="recipe.image",
-        read_only=True,
-    )
+    image = RenditionImageField(source="recipe")
     cooking_time = serializers.ReadOnlyField(
         source="recipe.cooking_time",
     )
@@ -230,15 +290,10 @@ class FavoriteSerializer(serializers.ModelSerializer):
         model = Favorite
         fields = ("id", "name", "image", "cooking_time")
 
-    def validate(self, data):
-        user = self.context.get("request").user
-        recipe = self.context.get("recipe_id")
-        if Favorite.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError({"errors": "Recipe already in Favorite"})
-        return data
-
 
 class SubscribeRecipeSerializer(serializers.ModelSerializer):
+    image = RenditionImageField(source="*")
+
     class Meta:
         model = Recipe
         fields = ("id", "name", "image", "cooking_time")
@@ -272,20 +327,21 @@ class SubscribeSerializer(serializers.ModelSerializer):
         author_id = int(self.context.get("author_id"))
         if user_id == author_id:
             raise serializers.ValidationError({"errors": "Denied"})
-        if Subscribe.objects.filter(user_id=user_id, author_id=author_id).exists():
-            raise serializers.ValidationError({"errors": "You`ve already Subscribed"})
         return data
 
     def get_recipes(self, obj):
-        recipes = obj.author.recipes.all()
+        recipes = getattr(obj.author, "subscription_recipes", None)
+        if recipes is None:
+            recipes = obj.author.recipes.all()
+            limit = self.context.get("recipes_limit")
+            if limit is not None:
+                recipes = recipes[:limit]
         return SubscribeRecipeSerializer(recipes, many=True).data
 
     def get_is_subscribed(self, obj):
-        if Subscribe.objects.filter(
-            user=self.context.get("request").user, author=obj.author
-        ).exists():
-            return True
-        return False
+        return True
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, "recipes_count"):
+            return obj.recipes_count
         return obj.author.recipes.count()
@@ -0,0 +1,38 @@
+import csv
+import json
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def txt_rows(cart):
+    yield "Список покупок:\n\n"
+    for item in cart:
+        yield f"{item['name']} ({item['measurement_unit']}) — {item['amount']}\n"
+
+
+def csv_rows(cart):
+    writer = csv.writer(Echo())
+    yield writer.writerow(("name", "measurement_unit", "amount"))
+    for item in cart:
+        yield writer.writerow(
+            (item["name"], item["measurement_unit"], item["amount"])
+        )
+
+
+def json_rows(cart):
+    separator = ""
+    yield "["
+    for item in cart:
+        yield separator + json.dumps(item, ensure_ascii=False)
+        separator = ","
+    yield "]"
+
+
+EXPORT_FORMATS = {
+    "txt": (txt_rows, "text/plain; charset=utf-8"),
+    "csv": (csv_rows, "text/csv; charset=utf-8"),
+    "json": (json_rows, "application/json; charset=utf-8"),
+}
@@ -0,0 +1,132 @@
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredRecipe,
+    Recipe,
+    ShoppingList,
+    Tag,
+    refresh_search_documents,
+)
+from users.models import Subscribe
+
+from api import feed_cache, relations
+from api.catalogue import ingredient_catalogue, tag_catalogue
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_catalogue(sender, **kwargs):
+    transaction.on_commit(ingredient_catalogue.bump)
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_recipe_search(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    def refresh():
+        if refresh_search_documents(Recipe.objects.filter(ingredients=instance)):
+            feed_cache.invalidate("recipes")
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_catalogue(sender, **kwargs):
+    transaction.on_commit(tag_catalogue.bump)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_feed(sender, instance, **kwargs):
+    tags = ("recipes", f"recipe:{instance.pk}")
+    transaction.on_commit(lambda: feed_cache.invalidate(*tags))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def invalidate_favorite_recipe(sender, instance, **kwargs):
+    """Избранное меняет только счётчик: страницы ленты с ним живут до таймаута."""
+    tag = f"recipe:{instance.recipe_id}"
+    transaction.on_commit(lambda: feed_cache.invalidate(tag))
+
+
+@receiver(post_save, sender=IngredRecipe)
+@receiver(post_delete, sender=IngredRecipe)
+def invalidate_related_recipe(sender, instance, **kwargs):
+    """Связанные строки меняются без post_save самого рецепта."""
+    tags = ("recipes", f"recipe:{instance.recipe_id}")
+    transaction.on_commit(lambda: feed_cache.invalidate(*tags))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, pk_set, reverse, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        recipes = pk_set or ()
+    else:
+        recipes = (instance.pk,)
+    tags = ("recipes", *(f"recipe:{pk}" for pk in recipes))
+    transaction.on_commit(lambda: feed_cache.invalidate(*tags))
+
+
+RELATION_KINDS = {model: kind for kind, (model, _) in relations.SOURCES.items()}
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_delete, sender=Subscribe)
+def refresh_user_relations(sender, instance, raw=False, **kwargs):
+    """Наборы связей меняются и из админки, и каскадным удалением."""
+    if raw:
+        return
+    kind = RELATION_KINDS[sender]
+    previous = getattr(instance, "previous_row", None)
+    if previous is not None and previous.user_id != instance.user_id:
+        relations.changed(previous.user_id, kind)
+    relations.changed(instance.user_id, kind)
+
+
+def idle_for(connection, now):
+    return now - getattr(connection, "idle_since", 0)
+
+
+@receiver(request_started)
+def close_unusable_connections(sender, **kwargs):
+    """Проверка постоянных соединений перед запросом, как CONN_HEALTH_CHECKS.
+
+    Пингуются только соединения, простоявшие дольше DB_HEALTH_CHECK_IDLE:
+    под нагрузкой запросы, которым не нужна база, обходятся без SELECT 1.
+    """
+    if not settings.DB_HEALTH_CHECKS:
+        return
+    now = time.monotonic()
+    for connection in connections.all():
+        if (
+            connection.connection is not None
+            and not connection.in_atomic_block
+            and idle_for(connection, now) >= settings.DB_HEALTH_CHECK_IDLE
+            and not connection.is_usable()
+        ):
+            connection.close()
+
+
+@receiver(request_finished)
+def mark_connections_idle(sender, **kwargs):
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.idle_since = now
@@ -0,0 +1,473 @@
+import asyncio
+
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredRecipe,
+    Recipe,
+    ShoppingCartTotal,
+    ShoppingList,
+    Tag,
+)
+from users.models import Subscribe, User
+
+from api import relations
+from api.filters import RecipeFilter
+from api.middleware import InstrumentationMiddleware
+
+
+class RecipeFeedTestCase(TestCase):
+    """Лента из 60 рецептов с тегами и ингредиентами."""
+
+    recipes_count = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="reader", email="reader@example.com")
+        author = User.objects.create(username="author", email="author@example.com")
+        tags = [
+            Tag.objects.create(name="Завтрак", slug="breakfast", color="#E26C2D"),
+            Tag.objects.create(name="Обед", slug="lunch", color="#49B64E"),
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f"Ингредиент {number}", measurement_unit="г")
+            for number in range(3)
+        ]
+        cls.recipes = []
+        for number in range(cls.recipes_count):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f"Рецепт {number}",
+                text="Описание",
+                cooking_time=10,
+                image="recipes/images/test.jpg",
+            )
+            recipe.tags.set(tags)
+            IngredRecipe.objects.bulk_create(
+                IngredRecipe(recipe=recipe, ingredient=ingredient, amount=number + 1)
+                for ingredient in ingredients
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_recipes(self, **params):
+        """Запросы к БД и ответ для свежего кэша связей и ленты."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/recipes/", params)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()["results"]
+
+
+class RecipeFlagQueriesTest(RecipeFeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.favorited = {recipe.pk for recipe in cls.recipes[::2]}
+        cls.in_cart = {recipe.pk for recipe in cls.recipes[::3]}
+        for pk in cls.favorited:
+            Favorite.objects.create(user=cls.user, recipe_id=pk)
+        for pk in cls.in_cart:
+            ShoppingList.objects.create(user=cls.user, recipe_id=pk)
+
+    def test_flags_match_user_relations(self):
+        _, results = self.get_recipes(limit=60)
+        self.assertEqual(
+            {recipe["id"] for recipe in results if recipe["is_favorited"]},
+            self.favorited,
+        )
+        self.assertEqual(
+            {recipe["id"] for recipe in results if recipe["is_in_shopping_cart"]},
+            self.in_cart,
+        )
+
+    def test_flag_queries_do_not_grow_with_page(self):
+        small, _ = self.get_recipes(limit=6)
+        large, _ = self.get_recipes(limit=60)
+        self.assertEqual(small, large)
+
+
+class RecipePageQueriesTest(RecipeFeedTestCase):
+    """Число запросов страницы не зависит от её размера."""
+
+    recipes_count = 120
+
+    def test_page_queries_do_not_grow_with_page_size(self):
+        small, results = self.get_recipes(page=2, limit=6)
+        self.assertEqual(len(results), 6)
+        large, results = self.get_recipes(page=2, limit=60)
+        self.assertEqual(len(results), 60)
+        self.assertEqual(small, large)
+
+
+class ShoppingListIndexTest(TestCase):
+    """Запросы к корзине идут по составным индексам ShoppingList."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="reader", email="reader@example.com")
+        cls.recipe = Recipe.objects.create(
+            author=cls.user,
+            name="Рецепт",
+            text="Описание",
+            cooking_time=10,
+            image="recipes/images/test.jpg",
+        )
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+    def tearDown(self):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("RESET enable_seqscan")
+
+    def index_names(self, *columns):
+        """Имена индексов корзины ровно по столбцам columns."""
+        table = ShoppingList._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                # Уникальное ограничение в SQLite живёт в sqlite_autoindex_*.
+                cursor.execute(f'PRAGMA index_list("{table}")')
+                indexes = {}
+                for row in cursor.fetchall():
+                    cursor.execute(f'PRAGMA index_info("{row[1]}")')
+                    indexes[row[1]] = [info[2] for info in cursor.fetchall()]
+            else:
+                indexes = {
+                    name: constraint["columns"]
+                    for name, constraint in connection.introspection.get_constraints(
+                        cursor, table
+                    ).items()
+                    if constraint["index"] or constraint["unique"]
+                }
+        return {name for name, names in indexes.items() if names == list(columns)}
+
+    def assert_uses_index(self, queryset, names):
+        plan = queryset.explain()
+        self.assertTrue(
+            any(name in plan for name in names), f"{sorted(names)} not in:\n{plan}"
+        )
+
+    def test_is_in_shopping_cart_exists(self):
+        request = APIRequestFactory().get("/api/recipes/")
+        request.user = self.user
+        queryset = RecipeFilter(
+            {"is_in_shopping_cart": True},
+            queryset=Recipe.objects.all(),
+            request=request,
+        ).qs
+        self.assert_uses_index(queryset, self.index_names("user_id", "recipe_id"))
+
+    def test_relations_load(self):
+        queryset = ShoppingList.objects.filter(user_id=self.user.pk).values_list(
+            "recipe_id", flat=True
+        )
+        self.assert_uses_index(queryset, self.index_names("user_id", "recipe_id"))
+
+    def test_toggle_delete(self):
+        # Условие по обоим столбцам покрывает любой из составных индексов.
+        queryset = ShoppingList.objects.filter(recipe_id=self.recipe.pk, user=self.user)
+        self.assert_uses_index(
+            queryset,
+            self.index_names("user_id", "recipe_id")
+            | self.index_names("recipe_id", "user_id"),
+        )
+
+    def test_recipe_holders(self):
+        queryset = ShoppingList.objects.filter(recipe_id=self.recipe.pk).values_list(
+            "user_id", flat=True
+        )
+        self.assert_uses_index(queryset, self.index_names("recipe_id", "user_id"))
+
+
+class RecipeSearchDocumentTest(TestCase):
+    """Рецепты из админки и ORM попадают в поиск."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username="author", email="author@example.com")
+        cls.beet = Ingredient.objects.create(name="Свёкла", measurement_unit="г")
+        cls.dill = Ingredient.objects.create(name="Укроп", measurement_unit="г")
+
+    def setUp(self):
+        cache.clear()
+
+    def create_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.author,
+                name="Борщ красный",
+                text="Описание",
+                cooking_time=60,
+                image="recipes/images/test.jpg",
+            )
+            IngredRecipe.objects.create(recipe=recipe, ingredient=self.beet, amount=2)
+        return recipe
+
+    def search(self, value):
+        response = APIClient().get("/api/recipes/", {"search": value})
+        self.assertEqual(response.status_code, 200)
+        return [recipe["id"] for recipe in response.json()["results"]]
+
+    def test_orm_recipe_is_searchable(self):
+        recipe = self.create_recipe()
+        self.assertEqual(self.search("борщ"), [recipe.pk])
+        self.assertEqual(self.search("свёкла"), [recipe.pk])
+
+    def test_recipe_edit_refreshes_document(self):
+        recipe = self.create_recipe()
+        recipe.name = "Суп"
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.search_document, "Суп Описание Свёкла")
+
+    def test_ingredient_rows_refresh_document(self):
+        recipe = self.create_recipe()
+        row = recipe.recipe.get()
+        row.ingredient = self.dill
+        with self.captureOnCommitCallbacks(execute=True):
+            row.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.search_document, "Борщ красный Описание Укроп")
+        with self.captureOnCommitCallbacks(execute=True):
+            row.delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.search_document, "Борщ красный Описание")
+
+
+@override_settings(API_INSTRUMENTATION_SAMPLE_RATE=1)
+class InstrumentationTest(RecipeFeedTestCase):
+    recipes_count = 6
+
+    def assert_timings(self, response):
+        timings = dict(
+            part.split(";dur=")[0:2]
+            for part in response["Server-Timing"].split(", ")
+        )
+        self.assertEqual(
+            set(timings), {"db", "serialize", "app", "render", "total"}
+        )
+        self.assertGreater(float(timings["serialize"]), 0)
+        self.assertGreater(float(timings["render"]), 0)
+
+    def test_server_timing(self):
+        self.assert_timings(self.client.get("/api/recipes/"))
+
+    def test_middleware_is_async_capable(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(InstrumentationMiddleware.async_capable)
+        self.assertTrue(
+            asyncio.iscoroutinefunction(InstrumentationMiddleware(get_response))
+        )
+
+    async def test_server_timing_under_asgi(self):
+        response = await AsyncClient().get("/api/recipes/")
+        self.assertEqual(response.status_code, 200)
+        self.assert_timings(response)
+
+
+class ToggleDeleteTest(RecipeFeedTestCase):
+    """Снятие избранного и корзины удаляет строку одним DELETE."""
+
+    recipes_count = 1
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[0]
+        self.client.post(f"/api/recipes/{self.recipe.pk}/favorite/")
+        self.client.post(f"/api/recipes/{self.recipe.pk}/shopping_cart/")
+
+    def delete(self, path):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.delete(f"/api/recipes/{self.recipe.pk}/{path}/")
+        self.assertEqual(response.status_code, 204)
+        return [
+            query["sql"].split()[0]
+            for query in context.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+
+    def test_favorite_delete(self):
+        self.assertEqual(self.delete("favorite"), ["DELETE", "UPDATE"])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_cart_delete(self):
+        self.assertEqual(
+            self.delete("shopping_cart"), ["DELETE", "SELECT", "UPDATE", "DELETE"]
+        )
+        self.assertFalse(ShoppingCartTotal.objects.filter(user=self.user).exists())
+
+
+class FavoriteFeedCacheTest(RecipeFeedTestCase):
+    """Избранное сбрасывает кэш только своего рецепта."""
+
+    recipes_count = 2
+
+    def test_favorite_keeps_list_cache(self):
+        anonymous = APIClient()
+        recipe = self.recipes[0]
+        anonymous.get("/api/recipes/")
+        anonymous.get(f"/api/recipes/{recipe.pk}/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/recipes/{recipe.pk}/favorite/")
+        with CaptureQueriesContext(connection) as context:
+            response = anonymous.get("/api/recipes/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(context.captured_queries), 0)
+        response = anonymous.get(f"/api/recipes/{recipe.pk}/")
+        self.assertEqual(response.json()["favorites_count"], 1)
+
+
+class RecipeEtagTest(RecipeFeedTestCase):
+    """ETag различает страницы, фильтры и формат ответа."""
+
+    recipes_count = 12
+
+    def etag(self, path, **headers):
+        response = self.client.get(path, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_etag_depends_on_query_and_format(self):
+        first = self.etag("/api/recipes/?page=1")
+        self.assertNotEqual(first, self.etag("/api/recipes/?page=2"))
+        self.assertNotEqual(first, self.etag("/api/recipes/?page=1&format=api"))
+        self.assertNotEqual(
+            self.etag("/api/ingredients/?name=%D0%B0"),
+            self.etag("/api/ingredients/?name=%D0%B1"),
+        )
+        response = self.client.get("/api/recipes/?page=2", HTTP_IF_NONE_MATCH=first)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get("/api/recipes/?page=1", HTTP_IF_NONE_MATCH=first)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn("Last-Modified", response)
+
+
+class RelationsInvalidationTest(RecipeFeedTestCase):
+    """Наборы связей обновляются при изменениях вне представлений."""
+
+    recipes_count = 2
+
+    def cached_set(self, kind):
+        return relations.IdSet.from_bytes(
+            cache.get(relations.cache_key(self.user.pk, kind))
+        )
+
+    def test_orm_favorite_updates_flag(self):
+        recipe = self.recipes[0]
+        self.get_recipes()
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.user, recipe=recipe)
+        response = self.client.get(f"/api/recipes/{recipe.pk}/")
+        self.assertTrue(response.json()["is_favorited"])
+        self.assertIn(recipe.pk, self.cached_set("favorites"))
+
+    def test_cascade_delete_updates_sets(self):
+        recipe = self.recipes[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            ShoppingList.objects.create(user=self.user, recipe=recipe)
+            Subscribe.objects.create(user=self.user, author=recipe.author)
+        self.assertIn(recipe.pk, self.cached_set("cart"))
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.author.delete()
+        self.assertNotIn(recipe.pk, self.cached_set("cart"))
+        self.assertEqual(len(self.cached_set("subscriptions")), 0)
+
+
+class ShoppingCartTotalTest(RecipeFeedTestCase):
+    """Итоги корзин совпадают с пересчётом после каждого изменения."""
+
+    recipes_count = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = User.objects.create(username="other", email="other@example.com")
+        ShoppingList.objects.create(user=cls.other, recipe=cls.recipes[0])
+        ShoppingList.objects.create(user=cls.other, recipe=cls.recipes[1])
+
+    def assert_totals(self):
+        actual = {
+            (row.user_id, row.ingredient_id): row.amount
+            for row in ShoppingCartTotal.objects.all()
+        }
+        expected = {
+            (row["user_id"], row["ingredient_id"]): row["amount"]
+            for row in ShoppingCartTotal.objects.expected()
+        }
+        self.assertEqual(actual, expected)
+
+    def add_to_cart(self, recipe):
+        response = self.client.post(f"/api/recipes/{recipe.pk}/shopping_cart/")
+        self.assertEqual(response.status_code, 201)
+
+    def test_add_to_cart(self):
+        self.assert_totals()
+        self.add_to_cart(self.recipes[0])
+        self.add_to_cart(self.recipes[1])
+        self.assert_totals()
+
+    def test_remove_from_cart(self):
+        self.add_to_cart(self.recipes[0])
+        self.add_to_cart(self.recipes[1])
+        response = self.client.delete(
+            f"/api/recipes/{self.recipes[0].pk}/shopping_cart/"
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals()
+
+    def test_recipe_ingredient_edit(self):
+        self.add_to_cart(self.recipes[0])
+        recipe = self.recipes[0]
+        rows = list(recipe.recipe.order_by("ingredient_id"))
+        extra = Ingredient.objects.create(name="Перец", measurement_unit="г")
+        author = APIClient()
+        author.force_authenticate(recipe.author)
+        response = author.patch(
+            f"/api/recipes/{recipe.pk}/",
+            {
+                "ingredients": [
+                    {"id": rows[0].ingredient_id, "amount": rows[0].amount},
+                    {"id": rows[1].ingredient_id, "amount": rows[1].amount + 5},
+                    {"id": extra.pk, "amount": 7},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals()
+        row = rows[0]
+        row.amount += 3
+        row.save()
+        self.assert_totals()
+
+    def test_recipe_delete(self):
+        self.add_to_cart(self.recipes[0])
+        self.add_to_cart(self.recipes[2])
+        self.recipes[0].delete()
+        self.assert_totals()
+        self.assertTrue(ShoppingCartTotal.objects.filter(user=self.user).exists())
+
+    def test_user_delete(self):
+        self.add_to_cart(self.recipes[0])
+        self.other.delete()
+        self.assert_totals()
+        self.assertFalse(ShoppingCartTotal.objects.filter(user=self.other).exists())
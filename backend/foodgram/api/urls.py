@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api import async_views
 from api.views import (
     FavoriteViewSet,
     IngredientViewSet,
+    MetricsView,
     RecipeViewSet,
     ShoppingListViewSet,
     SubscribeViewSet,
@@ -29,7 +32,16 @@ router.register(
 )
 
 urlpatterns = [
+    path("metrics/", MetricsView.as_view(), name="metrics"),
     path("", include(router.urls)),
     path(r"auth/", include("djoser.urls.authtoken")),
     path("", include("djoser.urls")),
 ]
+
+if settings.ASYNC_VIEWS:
+    urlpatterns = [
+        path("tags/", async_views.tag_list),
+        path("tags/<int:pk>/", async_views.tag_detail),
+        path("ingredients/", async_views.ingredient_list),
+        path("ingredients/<int:pk>/", async_views.ingredient_detail),
+    ] + urlpatterns
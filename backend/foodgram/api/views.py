@@ -1,16 +1,48 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Count,
+    F,
+    OuterRef,
+    Prefetch,
+    Subquery,
+)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-
-from recipes.models import Favorite, Ingredient, Recipe, ShoppingList, Tag
+from rest_framework.views import APIView
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredRecipe,
+    Recipe,
+    ShoppingCartTotal,
+    ShoppingList,
+    Tag,
+)
+from recipes.signals import change_favorites_count
 from users.models import Subscribe, User
 
-from api.filters import IngredientFilter, RecipeFilter
+from api import feed_cache, metrics, relations
+from api.catalogue import catalogue_response, ingredient_catalogue, tag_catalogue
+from api.filters import RecipeFilter, RecipeOrderingFilter, RecipeSearchFilter
+from api.middleware import timed_serializer
+from api.mixins import (
+    ConditionalGetMixin,
+    InstrumentedViewMixin,
+    ReplicaRoutingMixin,
+    make_etag,
+)
+from api.pagination import KeysetPagination, RecipePagination
 from api.permissions import AuthorOrReadOnly
+from api.renderers import CSVRenderer, PlainTextRenderer
 from api.serializers import (
     RecipeWriteSerializer,
     FavoriteSerializer,
@@ -23,10 +55,59 @@ from api.serializers import (
     TagSerializer,
     UserReadSerializer,
 )
+from api.search import search_ingredients
+from api.shopping_cart import EXPORT_FORMATS
 from django_filters import rest_framework as filters
 
 
+def get_recipes_limit(request):
+    value = request.query_params.get("recipes_limit")
+    if value is None:
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = -1
+    if limit < 0:
+        raise ValidationError({"recipes_limit": "Must be a non-negative integer"})
+    return limit
+
+
+def prefetch_subscription_recipes(limit):
+    recipes = Recipe.objects.only(
+        "id", "name", "image", "image_renditions", "cooking_time", "author"
+    )
+    if limit is not None:
+        recipes = recipes.filter(
+            pk__in=Subquery(
+                Recipe.objects.filter(author=OuterRef("author")).values("pk")[:limit]
+            )
+        )
+    return Prefetch("author__recipes", queryset=recipes, to_attr="subscription_recipes")
+
+
+def fast_delete(queryset):
+    """Удаляет строки одним DELETE и возвращает их число.
+
+    Сборщик Django для моделей с получателями post_delete сначала выбирает
+    строки и шлёт сигнал на каждую, поэтому их действия выполняет
+    вызывающий код.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def save_unique(serializer, message, **kwargs):
+    """Сохраняет связь; повтор ловится уникальным ограничением, а не exists()."""
+    try:
+        with transaction.atomic():
+            return serializer.save(**kwargs)
+    except IntegrityError:
+        raise ValidationError({"errors": message})
+
+
 class UserView(
+    InstrumentedViewMixin,
+    ReplicaRoutingMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
@@ -34,7 +115,7 @@ class UserView(
 ):
     queryset = User.objects.all()
     permission_classes = (permissions.AllowAny,)
-    pagination_class = PageNumberPagination
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.action in ("list", "retrieve"):
@@ -59,7 +140,7 @@ class UserView(
         permission_classes=(permissions.IsAuthenticated,),
     )
     def me(self, request):
-        serializer = UserReadSerializer(request.user)
+        serializer = timed_serializer(UserReadSerializer(request.user), request)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(
@@ -69,37 +150,163 @@ class UserView(
         permission_classes=(permissions.IsAuthenticated,),
     )
     def subscribe_list(self, request):
-        queryset = Subscribe.objects.filter(user=request.user)
+        limit = get_recipes_limit(request)
+        queryset = (
+            Subscribe.objects.filter(user=request.user)
+            .select_related("author")
+            .annotate(recipes_count=Count("author__recipes"))
+            .prefetch_related(prefetch_subscription_recipes(limit))
+            .order_by("id")
+        )
         page = self.paginate_queryset(queryset)
-        serializer = SubscribeSerializer(page, many=True, context={"request": request})
+        serializer = timed_serializer(
+            SubscribeSerializer(
+                page, many=True, context={"request": request, "recipes_limit": limit}
+            ),
+            request,
+        )
 
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(
+    InstrumentedViewMixin,
+    ReplicaRoutingMixin,
+    ConditionalGetMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     permission_classes = (permissions.AllowAny,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
+    def get_etag_version(self, request):
+        return tag_catalogue.version()
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+    def list(self, request, *args, **kwargs):
+        return catalogue_response(tag_catalogue.state().render())
+
+    def retrieve(self, request, *args, **kwargs):
+        return catalogue_response(tag_catalogue.state().get(kwargs["pk"]))
+
+
+class IngredientViewSet(
+    InstrumentedViewMixin,
+    ReplicaRoutingMixin,
+    ConditionalGetMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     permission_classes = (permissions.AllowAny,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filterset_class = IngredientFilter
 
+    def get_etag_version(self, request):
+        return ingredient_catalogue.version()
+
+    def list(self, request, *args, **kwargs):
+        catalogue = ingredient_catalogue.state()
+        name = request.query_params.get("name")
+        if name:
+            return catalogue_response(catalogue.render(search_ingredients(name)))
+        return catalogue_response(catalogue.render())
+
+    def retrieve(self, request, *args, **kwargs):
+        return catalogue_response(ingredient_catalogue.state().get(kwargs["pk"]))
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(
+    InstrumentedViewMixin,
+    ReplicaRoutingMixin,
+    ConditionalGetMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Recipe.objects.all()
     permission_classes = (
         AuthorOrReadOnly,
         permissions.IsAuthenticatedOrReadOnly,
     )
-    pagination_class = PageNumberPagination
-    filter_backends = (filters.DjangoFilterBackend,)
+    pagination_class = RecipePagination
+    filter_backends = (
+        filters.DjangoFilterBackend,
+        RecipeSearchFilter,
+        RecipeOrderingFilter,
+    )
     filterset_class = RecipeFilter
+    ordering_fields = ("favorites_count", "pub_date")
+
+    def initial(self, request, *args, **kwargs):
+        self.feed_cache_key = None
+        self.cached_entry = None
+        if (
+            settings.RECIPE_FEED_CACHE
+            and request.method in ("GET", "HEAD")
+            and self.action in ("list", "retrieve")
+            and not request.user.is_authenticated
+        ):
+            self.feed_cache_key = feed_cache.make_key(
+                request,
+                self.feed_tags(),
+                tag_catalogue.version(),
+                ingredient_catalogue.version(),
+            )
+            self.cached_entry = feed_cache.get(self.feed_cache_key)
+        super().initial(request, *args, **kwargs)
+
+    def feed_tags(self):
+        if self.action == "retrieve":
+            return [f"recipe:{self.kwargs.get('pk')}"]
+        return ["recipes"]
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        """Ответ анонимному пользователю из кэша ленты."""
+        if self.cached_entry is not None:
+            return Response(self.cached_entry["data"])
+        response = handler(request, *args, **kwargs)
+        if self.feed_cache_key is not None:
+            feed_cache.store(
+                self.feed_cache_key,
+                {"data": response.data, "etag_version": self.etag_version},
+            )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_etag_version(self, request):
+        if self.cached_entry is not None:
+            # Записи прежнего формата без etag_version живут до таймаута.
+            return self.cached_entry.get("etag_version")
+        # Версии тегов кэша ленты меняются теми же сигналами, что сбрасывают
+        # кэш, поэтому ETag не требует запросов к таблице рецептов.
+        parts = [
+            *feed_cache.tag_versions(self.feed_tags()),
+            tag_catalogue.version(),
+            ingredient_catalogue.version(),
+        ]
+        if self.action == "list":
+            # Избранное не сбрасывает версию ленты, поэтому ETag списка
+            # обновляется хотя бы раз за время жизни кэша ленты.
+            parts.append(int(time.time()) // max(settings.RECIPE_FEED_CACHE_TIMEOUT, 1))
+        user = request.user
+        if user.is_authenticated:
+            parts.append(user.pk)
+            parts.extend(relations.relations_for(request).fingerprint())
+        return make_etag(*parts)
+
+    def get_queryset(self):
+        if self.action not in ("list", "retrieve"):
+            return Recipe.objects.all()
+        return Recipe.objects.select_related("author").prefetch_related(
+            "tags",
+            Prefetch(
+                "recipe",
+                queryset=IngredRecipe.objects.select_related("ingredient"),
+            ),
+        )
 
     def get_serializer_class(self):
         if self.request.method not in permissions.SAFE_METHODS:
@@ -111,36 +318,37 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=("get",),
         url_path="download_shopping_cart",
         pagination_class=None,
+        permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer),
     )
     def download_file(self, request):
-        user = request.user
-        if ShoppingList.objects.filter(user=user).exists():
-            user = ShoppingList.objects.filter(user=user)
-            shopping_list = "Список покупок:\n\n"
-            ingred_name = "recipe__recipe__ingredient__name"
-            measurement_unit = "recipe__recipe__ingredient__measurement_unit"
-            amount = "recipe__recipe__amount"
-            amount_sum = "recipe__recipe__amount__sum"
-            cart = (
-                user.values(ingred_name, measurement_unit)
-                .annotate(Sum(amount))
-                .order_by(ingred_name)
+        cart = (
+            ShoppingCartTotal.objects.filter(user=request.user)
+            .values(
+                "amount",
+                name=F("ingredient__name"),
+                measurement_unit=F("ingredient__measurement_unit"),
             )
-            for _ in cart:
-                shopping_list += (
-                    f"{_[ingred_name]} ({_[measurement_unit]})" f" — {_[amount_sum]}\n"
-                )
-            file = HttpResponse(shopping_list, content_type="text/plain")
-            filename = "c"
-            file["Content-Disposition"] = f"attachment; filename={filename}"
-            return file
-        return Response(
-            "No recipes in Shopping Lists", status=status.HTTP_400_BAD_REQUEST
+            .order_by("name", "measurement_unit")
         )
+        if not cart.exists():
+            return Response(
+                "No recipes in Shopping Lists", status=status.HTTP_400_BAD_REQUEST
+            )
+        export_format = request.accepted_renderer.format
+        rows, content_type = EXPORT_FORMATS[export_format]
+        file = StreamingHttpResponse(rows(cart.iterator()), content_type=content_type)
+        filename = f"shopping_list.{export_format}"
+        file["Content-Disposition"] = f"attachment; filename={filename}"
+        return file
 
 
 class ShoppingListViewSet(
-    mixins.CreateModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+    InstrumentedViewMixin,
+    ReplicaRoutingMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
 ):
     serializer_class = ShoppingListSerializer
     permission_classes = (permissions.IsAuthenticated,)
@@ -153,17 +361,26 @@ class ShoppingListViewSet(
         context["recipe_id"] = self.kwargs.get("recipe_id")
         return context
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(
+        recipe = get_object_or_404(Recipe, id=self.kwargs.get("recipe_id"))
+        save_unique(
+            serializer,
+            "Recipe already in Shopping List",
             user=self.request.user,
-            recipe=get_object_or_404(Recipe, id=self.kwargs.get("recipe_id")),
+            recipe=recipe,
         )
 
     @action(methods=("delete",), detail=True)
+    @transaction.atomic
     def delete(self, request, recipe_id):
         user = request.user
-        if ShoppingList.objects.filter(recipe_id=recipe_id, user=user).exists():
-            get_object_or_404(ShoppingList, user=user, recipe=recipe_id).delete()
+        deleted = fast_delete(
+            ShoppingList.objects.filter(recipe_id=recipe_id, user=user)
+        )
+        if deleted:
+            ShoppingCartTotal.objects.remove_recipe([user.pk], recipe_id)
+            relations.changed(user.pk, "cart")
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {"errors": "Recipe not in Shopping List"},
@@ -172,7 +389,11 @@ class ShoppingListViewSet(
 
 
 class FavoriteViewSet(
-    mixins.CreateModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+    InstrumentedViewMixin,
+    ReplicaRoutingMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
 ):
     serializer_class = FavoriteSerializer
     permission_classes = (permissions.IsAuthenticated,)
@@ -185,17 +406,25 @@ class FavoriteViewSet(
         context["recipe_id"] = self.kwargs.get("recipe_id")
         return context
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(
+        recipe = get_object_or_404(Recipe, id=self.kwargs.get("recipe_id"))
+        save_unique(
+            serializer,
+            "Recipe already in Favorite",
             user=self.request.user,
-            recipe=get_object_or_404(Recipe, id=self.kwargs.get("recipe_id")),
+            recipe=recipe,
         )
 
     @action(methods=("delete",), detail=True)
+    @transaction.atomic
     def delete(self, request, recipe_id):
         user = request.user
-        if Favorite.objects.filter(recipe_id=recipe_id, user=user).exists():
-            get_object_or_404(Favorite, user=user, recipe_id=recipe_id).delete()
+        deleted = fast_delete(Favorite.objects.filter(recipe_id=recipe_id, user=user))
+        if deleted:
+            change_favorites_count(recipe_id, -deleted)
+            transaction.on_commit(lambda: feed_cache.invalidate(f"recipe:{recipe_id}"))
+            relations.changed(user.pk, "favorites")
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {"errors": "Recipe not in Favorite"}, status=status.HTTP_400_BAD_REQUEST
@@ -203,7 +432,11 @@ class FavoriteViewSet(
 
 
 class SubscribeViewSet(
-    mixins.CreateModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+    InstrumentedViewMixin,
+    ReplicaRoutingMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
 ):
     serializer_class = SubscribeSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
@@ -214,20 +447,32 @@ class SubscribeViewSet(
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["author_id"] = self.kwargs.get("user_id")
+        context["recipes_limit"] = get_recipes_limit(self.request)
         return context
 
     def perform_create(self, serializer):
-        serializer.save(
+        save_unique(
+            serializer,
+            "You`ve already Subscribed",
             user=self.request.user,
             author=get_object_or_404(User, id=self.kwargs.get("user_id")),
         )
 
     @action(methods=("delete",), detail=True)
     def delete(self, request, user_id):
-        get_object_or_404(User, id=user_id)
-        if Subscribe.objects.filter(user=request.user, author_id=user_id).exists():
-            get_object_or_404(Subscribe, user=request.user, author_id=user_id).delete()
+        deleted = fast_delete(
+            Subscribe.objects.filter(user=request.user, author_id=user_id)
+        )
+        if deleted:
+            relations.changed(request.user.pk, "subscriptions")
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {"errors": "Subscribe wasn`t create"}, status=status.HTTP_400_BAD_REQUEST
         )
+
+
+class MetricsView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response({**metrics.snapshot(), "histograms": metrics.histograms()})
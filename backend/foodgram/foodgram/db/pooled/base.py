@@ -0,0 +1,140 @@
+import threading
+import time
+
+import psycopg2
+import psycopg2.extras
+from django.conf import settings
+from django.db.backends.postgresql import base
+from psycopg2 import pool
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Свободное соединение не появилось за POOL["timeout"] секунд."""
+
+
+class WaitingConnectionPool(pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool, который ждёт соединение, а не падает.
+
+    getconn() исходного пула сразу бросает PoolError, когда все maxconn
+    соединений выданы; здесь поток ждёт освобождения до timeout секунд.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        # psycopg2 закрывает возвращённые соединения сверх minconn, и при
+        # нагрузке пул переоткрывал их на каждый запрос. minconn открыты
+        # при создании, дальше пул держит до maxconn простаивающих.
+        self.minconn = maxconn
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.idle_since = {}
+
+    def getconn(self, key=None):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(
+                f"No free database connection in {self.timeout}s "
+                f"(pool size {self.maxconn})"
+            )
+        try:
+            return super().getconn(key)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            if close or conn.closed:
+                self.idle_since.pop(id(conn), None)
+            else:
+                self.idle_since[id(conn)] = time.monotonic()
+            super().putconn(conn, key, close)
+        finally:
+            self.slots.release()
+
+    def idle_for(self, conn):
+        """Секунды с возврата в пул; только что открытое соединение не простаивало."""
+        returned = self.idle_since.get(id(conn))
+        return 0 if returned is None else time.monotonic() - returned
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с пулом соединений внутри процесса.
+
+    Соединение берётся из пула при первом запросе к БД и возвращается
+    в него при закрытии, поэтому CONN_MAX_AGE должен быть равен 0.
+    Размер пула и ожидание свободного соединения задаются ключом
+    POOL: {"min": ..., "max": ..., "timeout": ...}.
+    """
+
+    def get_pool(self, conn_params):
+        with pools_lock:
+            if self.alias not in pools:
+                options = self.settings_dict.get("POOL", {})
+                pools[self.alias] = WaitingConnectionPool(
+                    options.get("min", 1),
+                    options.get("max", 10),
+                    options.get("timeout", 5),
+                    **conn_params,
+                )
+            return pools[self.alias]
+
+    def checkout(self, conn_params):
+        connections_pool = self.get_pool(conn_params)
+        while True:
+            connection = connections_pool.getconn()
+            if connection.closed:
+                connections_pool.putconn(connection, close=True)
+                continue
+            if (
+                settings.DB_HEALTH_CHECKS
+                and connections_pool.idle_for(connection)
+                >= settings.DB_HEALTH_CHECK_IDLE
+                and not self.ping(connection)
+            ):
+                connections_pool.putconn(connection, close=True)
+                continue
+            if connection.autocommit:
+                connection.autocommit = False
+            return connection
+
+    @staticmethod
+    def ping(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        connection = self.checkout(conn_params)
+        try:
+            self.configure(connection)
+        except Exception:
+            pools[self.alias].putconn(connection, close=True)
+            raise
+        return connection
+
+    def configure(self, connection):
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = options["isolation_level"]
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            pools[self.alias].putconn(self.connection)
@@ -0,0 +1,24 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+use_replica = ContextVar("use_replica", default=False)
+
+
+class ReplicaRouter:
+    """Чтение с реплик внутри use_replica, запись и миграции на default."""
+
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
@@ -0,0 +1,21 @@
+from django.db import transaction
+
+
+def on_commit_once(key, func, using=None):
+    """transaction.on_commit, пропускающий ещё не выполненный вызов с тем же key.
+
+    Сигналы на каждую строку каскада или правки состава планируют одно и то
+    же действие много раз, а выполнить его после коммита достаточно однажды.
+    """
+    connection = transaction.get_connection(using)
+    for entry in connection.run_on_commit:
+        if getattr(entry[1], "on_commit_key", None) == key:
+            return
+
+    def callback():
+        # captureOnCommitCallbacks выполняет вызовы, не убирая их из списка.
+        callback.on_commit_key = None
+        func()
+
+    callback.on_commit_key = key
+    transaction.on_commit(callback, using)
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     'corsheaders.middleware.CorsMiddleware',
@@ -78,6 +79,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "foodgram.wsgi.application"
 
+ASGI_APPLICATION = "foodgram.asgi.application"
+
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False") == "True"
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -90,9 +95,77 @@ DATABASES = {
         "PASSWORD": os.getenv('POSTGRES_PASSWORD'),
         "HOST": os.getenv('DB_HOST'),
         "PORT": os.getenv('DB_PORT'),
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 60)),
     }
 }
 
+# persistent: соединение живёт CONN_MAX_AGE секунд;
+# pgbouncer: PgBouncer в режиме transaction, без серверных курсоров;
+# pool: пул соединений внутри процесса (foodgram.db.pooled).
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "persistent")
+
+if DB_POOL_MODE == "pgbouncer":
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+elif DB_POOL_MODE == "pool":
+    DATABASES["default"].update(
+        ENGINE="foodgram.db.pooled",
+        CONN_MAX_AGE=0,
+        POOL={
+            "min": int(os.getenv("DB_POOL_MIN", 1)),
+            "max": int(os.getenv("DB_POOL_MAX", 10)),
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", 5)),
+        },
+    )
+
+DB_HEALTH_CHECKS = os.getenv("DB_HEALTH_CHECKS", "True") == "True"
+
+# Соединение проверяется SELECT 1, только если простояло без запросов
+# дольше стольких секунд.
+DB_HEALTH_CHECK_IDLE = float(os.getenv("DB_HEALTH_CHECK_IDLE", 30))
+
+# Реплики через запятую: хосты (host[:port]) для PostgreSQL
+# или пути к файлам для SQLite.
+DATABASE_REPLICAS = []
+
+for number, replica in enumerate(
+    filter(None, os.getenv("DB_REPLICAS", "").split(",")), 1
+):
+    alias = f"replica{number}"
+    DATABASES[alias] = dict(DATABASES["default"], TEST={"MIRROR": "default"})
+    if "sqlite3" in str(DATABASES[alias]["ENGINE"]):
+        DATABASES[alias]["NAME"] = replica.strip()
+    else:
+        host, _, port = replica.strip().partition(":")
+        DATABASES[alias].update(HOST=host, PORT=port or DATABASES[alias]["PORT"])
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["foodgram.db.router.ReplicaRouter"] if DATABASE_REPLICAS else []
+
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 10))
+
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Число процессов gunicorn; им же проверяется, что кэш общий для всех.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+
+RECIPE_FEED_CACHE = os.getenv("RECIPE_FEED_CACHE", "True") == "True"
+
+RECIPE_FEED_CACHE_TIMEOUT = int(os.getenv("RECIPE_FEED_CACHE_TIMEOUT", 60))
+
+RELATIONS_CACHE_TIMEOUT = int(os.getenv("RELATIONS_CACHE_TIMEOUT", 600))
+
+API_INSTRUMENTATION_SAMPLE_RATE = float(
+    os.getenv("API_INSTRUMENTATION_SAMPLE_RATE", 0.05)
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -138,6 +211,27 @@ MEDIA_URL = "/media/"
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+RECIPE_IMAGE_SIZES = {
+    "card": int(os.getenv("RECIPE_IMAGE_CARD_WIDTH", 480)),
+    "detail": int(os.getenv("RECIPE_IMAGE_DETAIL_WIDTH", 1200)),
+}
+
+RECIPE_IMAGE_FORMAT = os.getenv("RECIPE_IMAGE_FORMAT", "jpeg")
+
+RECIPE_IMAGE_QUALITY = int(os.getenv("RECIPE_IMAGE_QUALITY", 80))
+
+RECIPE_IMAGE_WORKERS = int(os.getenv("RECIPE_IMAGE_WORKERS", 2))
+
+RECIPE_IMAGE_ASYNC = os.getenv("RECIPE_IMAGE_ASYNC", "True") == "True"
+
+RECIPE_IMAGE_MAX_BYTES = int(os.getenv("RECIPE_IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+
+RECIPE_IMAGE_MAX_PIXELS = int(os.getenv("RECIPE_IMAGE_MAX_PIXELS", 40_000_000))
+
+RECIPE_IMAGE_UPLOAD_WORKERS = int(os.getenv("RECIPE_IMAGE_UPLOAD_WORKERS", 2))
+
+RECIPE_IMAGE_UPLOAD_TIMEOUT = int(os.getenv("RECIPE_IMAGE_UPLOAD_TIMEOUT", 30))
+
 AUTH_USER_MODEL = "users.User"
 
 REST_FRAMEWORK = {
@@ -155,8 +249,17 @@ REST_FRAMEWORK = {
     ],
     "PAGE_SIZE": 6,
     "SEARCH_PARAM": "name",
+    "EXCEPTION_HANDLER": "api.exceptions.exception_handler",
 }
 
+INGREDIENT_SEARCH_BACKEND = os.getenv("INGREDIENT_SEARCH_BACKEND", "auto")
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv("INGREDIENT_SEARCH_LIMIT", 50))
+
+RECIPE_SEARCH_BACKEND = os.getenv("RECIPE_SEARCH_BACKEND", "auto")
+
+RECIPE_SEARCH_LIMIT = int(os.getenv("RECIPE_SEARCH_LIMIT", 500))
+
 DJOSER = {
     "LOGIN_FIELD": "email",
 }
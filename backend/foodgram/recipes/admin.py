@@ -1,14 +1,14 @@
 from django.contrib import admin
 
-from .models import (Favorite, Ingredient, IngredRecipe, Recipe, ShoppingList,
-                     Tag)
+from .models import (Favorite, Ingredient, IngredRecipe, Recipe,
+                     ShoppingCartTotal, ShoppingList, Tag)
 
 
 class RecipeAdmin(admin.ModelAdmin):
     """Создание модели Рецепт Администратора для админа."""
 
-    list_display = ("pk", "name", "author", "pub_date", "fav_count")
-    readonly_fields = ("fav_count",)
+    list_display = ("pk", "name", "author", "pub_date", "favorites_count")
+    readonly_fields = ("favorites_count",)
     list_filter = (
         "author",
         "name",
@@ -16,11 +16,6 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     empty_value_display = "-empty-"
 
-    def fav_count(self, obj):
-        return obj.recipe_fav.count()
-
-    fav_count.short_description = "Добавлений в избранное"
-
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ("pk", "name", "measurement_unit")
@@ -48,9 +43,15 @@ class IngredRecipeAdmin(admin.ModelAdmin):
     list_display = ("pk", "recipe", "ingredient", "amount")
 
 
+class ShoppingCartTotalAdmin(admin.ModelAdmin):
+    list_display = ("pk", "user", "ingredient", "amount")
+    list_select_related = ("user", "ingredient")
+
+
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Tag, TagAdmin)
 admin.site.register(ShoppingList, ShoppingListAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(IngredRecipe, IngredRecipeAdmin)
+admin.site.register(ShoppingCartTotal, ShoppingCartTotalAdmin)
@@ -0,0 +1,135 @@
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMATS = {"jpeg": ("JPEG", "jpg"), "webp": ("WEBP", "webp")}
+
+UPLOAD_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name, max_workers):
+    executor = _executors.get(name)
+    if executor is not None:
+        return executor
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=name
+            )
+        return _executors[name]
+
+
+def process_upload(source):
+    """Проверяет загруженное изображение и пересохраняет его без метаданных."""
+    source.seek(0)
+    with Image.open(source) as image:
+        if image.width * image.height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            raise ValueError("Image resolution is too large")
+        image.verify()
+    source.seek(0)
+    result = tempfile.TemporaryFile()
+    with Image.open(source) as image:
+        image_format = image.format if image.format in UPLOAD_FORMATS else "PNG"
+        image = ImageOps.exif_transpose(image)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(result, image_format, quality=settings.RECIPE_IMAGE_QUALITY)
+    result.seek(0)
+    return result, UPLOAD_FORMATS[image_format]
+
+
+def rendition_name(name, width, extension):
+    directory, filename = os.path.split(os.path.splitext(name)[0])
+    return os.path.join(directory, "renditions", f"{filename}_{width}.{extension}")
+
+
+def render(name):
+    """Сохраняет уменьшенные копии изображения и возвращает их пути."""
+    renditions = {}
+    with default_storage.open(name) as file, Image.open(file) as image:
+        image = image.convert("RGB")
+        for width in sorted(set(settings.RECIPE_IMAGE_SIZES.values())):
+            resized = image
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.LANCZOS)
+            for key, (image_format, extension) in RENDITION_FORMATS.items():
+                buffer = io.BytesIO()
+                resized.save(
+                    buffer, image_format, quality=settings.RECIPE_IMAGE_QUALITY
+                )
+                path = rendition_name(name, width, extension)
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                renditions.setdefault(str(width), {})[key] = default_storage.save(
+                    path, ContentFile(buffer.getvalue())
+                )
+    return renditions
+
+
+def build_renditions(recipe_id, name):
+    from recipes.models import Recipe
+
+    try:
+        renditions = render(name)
+        updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+            image_renditions=renditions, updated_at=timezone.now()
+        )
+        if updated:
+            # update() не отправляет post_save, кэш ленты сбрасывается здесь.
+            from api import feed_cache
+
+            transaction.on_commit(
+                lambda: feed_cache.invalidate("recipes", f"recipe:{recipe_id}")
+            )
+    except Exception:
+        logger.exception("Could not build renditions for recipe %s", recipe_id)
+
+
+def build_renditions_in_worker(recipe_id, name):
+    """build_renditions в потоке пула: соединение потока закрывается после."""
+    try:
+        build_renditions(recipe_id, name)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    if not recipe.image:
+        return
+    recipe_id, name = recipe.pk, recipe.image.name
+    if settings.RECIPE_IMAGE_ASYNC:
+        transaction.on_commit(
+            lambda: get_executor(
+                "renditions", settings.RECIPE_IMAGE_WORKERS
+            ).submit(build_renditions_in_worker, recipe_id, name)
+        )
+    else:
+        transaction.on_commit(lambda: build_renditions(recipe_id, name))
+
+
+def rendition_url(recipe, size):
+    """URL копии нужного размера или оригинала, пока копия не готова."""
+    width = settings.RECIPE_IMAGE_SIZES.get(size)
+    rendition = recipe.image_renditions.get(str(width), {})
+    name = rendition.get(settings.RECIPE_IMAGE_FORMAT)
+    if name:
+        return default_storage.url(name)
+    if recipe.image:
+        return recipe.image.url
+    return None
@@ -0,0 +1,406 @@
+import argparse
+import base64
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from recipes.management.commands.loadtest import percentile
+from recipes.models import Ingredient, Recipe, ShoppingList, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+
+def image_payload(width, height):
+    buffer = io.BytesIO()
+    Image.effect_noise((width, height), 64).convert("RGB").save(buffer, "JPEG")
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def max_rss_kb():
+    """Пиковый RSS процесса: Linux отдаёт килобайты, macOS байты."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every API endpoint through the Django test client: "
+        "p50/p99 latency and query counts, with a JSON baseline to compare"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument(
+            "--warmup", type=int, default=1,
+            help="Unmeasured runs before each read case",
+        )
+        parser.add_argument("--output", help="Write results to this JSON file")
+        parser.add_argument("--compare", help="Baseline JSON file to diff against")
+        parser.add_argument(
+            "--threshold", type=float, default=1.5,
+            help="Allowed p99 slowdown factor against the baseline",
+        )
+        parser.add_argument(
+            "--user", help="Username to benchmark as (default: the user with the fullest cart)"
+        )
+        parser.add_argument(
+            "--upload-runs", type=int, default=3,
+            help="Large image uploads, each in a fresh process",
+        )
+        parser.add_argument("--upload-child", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        self.repeat = options["repeat"]
+        self.samples = defaultdict(list)
+        self.queries = defaultdict(int)
+        self.statuses = {}
+        self.extra = {}
+        if options["upload_child"]:
+            self.upload_child(options["upload_child"], options["user"])
+            return
+        self.upload_runs = options["upload_runs"]
+        with override_settings(
+            ALLOWED_HOSTS=["testserver"], API_INSTRUMENTATION_SAMPLE_RATE=0
+        ):
+            self.setup_clients(options["user"])
+            self.run_reads(options["warmup"])
+            self.run_writes()
+        results = {
+            "dataset": {
+                "users": User.objects.count(),
+                "recipes": Recipe.objects.count(),
+                "ingredients": Ingredient.objects.count(),
+            },
+            "repeat": self.repeat,
+            "cases": {
+                name: {
+                    "status": self.statuses[name],
+                    "p50_ms": round(percentile(samples, 0.5) * 1000, 2),
+                    "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+                    "queries": self.queries[name],
+                    **self.extra.get(name, {}),
+                }
+                for name, samples in self.samples.items()
+            },
+        }
+        self.report(results["cases"])
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2, ensure_ascii=False)
+        if options["compare"]:
+            self.compare(results["cases"], options["compare"], options["threshold"])
+
+    def setup_clients(self, username):
+        if username:
+            self.user = User.objects.filter(username=username).first()
+        else:
+            self.user = (
+                User.objects.annotate(cart=Count("user_basket"))
+                .order_by("-cart", "pk")
+                .first()
+            )
+        if self.user is None or not Recipe.objects.exists():
+            raise CommandError("No data to benchmark, run seed_data first")
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.anonymous = Client()
+        self.client = Client(HTTP_AUTHORIZATION=f"Token {token.key}")
+        admin = User.objects.filter(is_staff=True).first()
+        self.admin = None
+        if admin is not None:
+            token, _ = Token.objects.get_or_create(user=admin)
+            self.admin = Client(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def measure(self, name, client, method, path, **kwargs):
+        if "data" in kwargs and method != "get":
+            kwargs["data"] = json.dumps(kwargs["data"])
+            kwargs["content_type"] = "application/json"
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        self.samples[name].append(elapsed)
+        self.queries[name] = max(self.queries[name], len(context.captured_queries))
+        self.statuses[name] = response.status_code
+        return response
+
+    def read(self, name, client, path, warmup):
+        for _ in range(warmup):
+            client.get(path)
+        for _ in range(self.repeat):
+            response = self.measure(name, client, "get", path)
+        return response
+
+    def run_reads(self, warmup):
+        recipe = Recipe.objects.order_by("-favorites_count").first()
+        tags = list(Tag.objects.values_list("slug", flat=True)[:5])
+        ingredient = Ingredient.objects.order_by("pk").first()
+        cart = ShoppingList.objects.filter(user=self.user).exists()
+        cases = [
+            ("users.list", self.anonymous, "/api/users/?limit=6"),
+            ("users.list.cursor", self.anonymous, "/api/users/?cursor=&limit=6"),
+            ("users.retrieve", self.client, f"/api/users/{recipe.author_id}/"),
+            ("users.me", self.client, "/api/users/me/"),
+            (
+                "users.subscriptions",
+                self.client,
+                "/api/users/subscriptions/?recipes_limit=3",
+            ),
+            ("tags.list", self.anonymous, "/api/tags/"),
+            ("tags.retrieve", self.anonymous, f"/api/tags/{Tag.objects.first().pk}/"),
+            ("ingredients.list", self.anonymous, "/api/ingredients/"),
+            (
+                "ingredients.search",
+                self.anonymous,
+                "/api/ingredients/?" + urlencode({"name": ingredient.name[:3]}),
+            ),
+            ("ingredients.retrieve", self.anonymous, f"/api/ingredients/{ingredient.pk}/"),
+            ("recipes.list.anonymous", self.anonymous, "/api/recipes/"),
+            ("recipes.list", self.client, "/api/recipes/"),
+            ("recipes.list.cursor", self.client, "/api/recipes/?cursor="),
+            (
+                "recipes.list.popular",
+                self.client,
+                "/api/recipes/?ordering=-favorites_count",
+            ),
+            ("recipes.list.favorited", self.client, "/api/recipes/?is_favorited=1"),
+            (
+                "recipes.list.in_cart",
+                self.client,
+                "/api/recipes/?is_in_shopping_cart=1",
+            ),
+            ("recipes.retrieve", self.client, f"/api/recipes/{recipe.pk}/"),
+            (
+                "recipes.search",
+                self.client,
+                "/api/recipes/?" + urlencode({"search": ingredient.name.split()[0]}),
+            ),
+            (
+                "recipes.search.two_words",
+                self.client,
+                "/api/recipes/?" + urlencode({"search": recipe.name}),
+            ),
+        ]
+        for count in (1, 3, 5):
+            query = "&".join(f"tags={slug}" for slug in tags[:count])
+            cases.append(
+                (
+                    f"recipes.list.tags_{count}",
+                    self.client,
+                    f"/api/recipes/?{query}&is_favorited=1&is_in_shopping_cart=0",
+                )
+            )
+        if cart:
+            for fmt in ("txt", "csv", "json"):
+                cases.append(
+                    (
+                        f"recipes.download_shopping_cart.{fmt}",
+                        self.client,
+                        f"/api/recipes/download_shopping_cart/?format={fmt}",
+                    )
+                )
+        if self.admin is not None:
+            cases.append(("metrics", self.admin, "/api/metrics/"))
+        for name, client, path in cases:
+            response = self.read(name, client, path, warmup)
+            if name.endswith(".cursor"):
+                next_link = response.json()["next"]
+                if next_link:
+                    self.read(f"{name}.page_2", client, next_link, warmup)
+
+    def run_writes(self):
+        ingredient_ids = list(
+            Ingredient.objects.order_by("pk").values_list("pk", flat=True)[:50]
+        )
+        tag_ids = list(Tag.objects.values_list("pk", flat=True)[:3])
+        image = image_payload(1200, 800)
+        author = (
+            User.objects.exclude(pk=self.user.pk)
+            .exclude(subscribed__user=self.user)
+            .first()
+        )
+        target = (
+            Recipe.objects.exclude(recipe_fav__user=self.user)
+            .exclude(recipe_basket__user=self.user)
+            .first()
+        )
+        for number in range(self.repeat):
+            data = {
+                "ingredients": [
+                    {"id": pk, "amount": 10} for pk in ingredient_ids
+                ],
+                "tags": tag_ids,
+                "image": image,
+                "name": f"Бенчмарк {number}",
+                "text": "Рецепт для замера",
+                "cooking_time": 30,
+            }
+            response = self.measure(
+                "recipes.create.50_ingredients", self.client, "post", "/api/recipes/", data=data
+            )
+            if response.status_code != 201:
+                raise CommandError(f"Could not create a recipe: {response.content!r}")
+            path = f"/api/recipes/{response.json()['id']}/"
+            data.pop("image")
+            data["ingredients"] = data["ingredients"][:25]
+            self.measure("recipes.update", self.client, "patch", path, data=data)
+            self.measure("recipes.delete", self.client, "delete", path)
+            if target is not None:
+                path = f"/api/recipes/{target.pk}/"
+                self.measure("favorite.create", self.client, "post", f"{path}favorite/")
+                self.measure("favorite.delete", self.client, "delete", f"{path}favorite/")
+                self.measure(
+                    "shopping_cart.create", self.client, "post", f"{path}shopping_cart/"
+                )
+                self.measure(
+                    "shopping_cart.delete", self.client, "delete", f"{path}shopping_cart/"
+                )
+            if author is not None:
+                path = f"/api/users/{author.pk}/subscribe/"
+                self.measure("subscribe.create", self.client, "post", path)
+                self.measure("subscribe.delete", self.client, "delete", path)
+            username = f"benchmark{number}"
+            self.measure(
+                "users.create",
+                self.anonymous,
+                "post",
+                "/api/users/",
+                data={
+                    "email": f"{username}@example.com",
+                    "username": username,
+                    "first_name": "Benchmark",
+                    "last_name": str(number),
+                    "password": "benchmark-password-1",
+                },
+            )
+            User.objects.filter(username=username).delete()
+        self.measure_upload()
+
+    def measure_upload(self):
+        """Пиковый RSS при загрузке крупного изображения.
+
+        tracemalloc не видит буферы Pillow, поэтому каждая загрузка идёт
+        в свежем процессе, а память считается по ru_maxrss до и после.
+        """
+        name = "recipes.create.upload_12mp"
+        data = {
+            "ingredients": [{"id": Ingredient.objects.first().pk, "amount": 1}],
+            "tags": [Tag.objects.first().pk],
+            "image": image_payload(4000, 3000),
+            "name": "Бенчмарк загрузки",
+            "text": "Рецепт для замера",
+            "cooking_time": 30,
+        }
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+            json.dump(data, file)
+        runs = []
+        try:
+            for _ in range(self.upload_runs):
+                completed = subprocess.run(
+                    [
+                        sys.executable,
+                        os.path.join(settings.BASE_DIR, "manage.py"),
+                        "benchmark_api",
+                        "--upload-child",
+                        file.name,
+                        "--user",
+                        self.user.username,
+                    ],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+                runs.append(json.loads(completed.stdout.splitlines()[-1]))
+        finally:
+            os.unlink(file.name)
+        for run in runs:
+            self.samples[name].append(run["elapsed"])
+            self.queries[name] = max(self.queries[name], run["queries"])
+            self.statuses[name] = run["status"]
+        if runs:
+            self.extra[name] = {
+                "peak_rss_kb": max(run["peak_rss_kb"] for run in runs),
+                "rss_growth_kb": max(
+                    run["peak_rss_kb"] - run["start_rss_kb"] for run in runs
+                ),
+                "payload_kb": len(data["image"]) // 1024,
+            }
+
+    def upload_child(self, path, username):
+        """Одна загрузка из measure_upload, результат строкой JSON."""
+        with open(path) as file:
+            data = json.load(file)
+        with override_settings(
+            ALLOWED_HOSTS=["testserver"], API_INSTRUMENTATION_SAMPLE_RATE=0
+        ):
+            self.setup_clients(username)
+            start_rss = max_rss_kb()
+            response = self.measure("upload", self.client, "post", "/api/recipes/", data=data)
+            peak_rss = max_rss_kb()
+        if response.status_code == 201:
+            Recipe.objects.filter(pk=response.json()["id"]).delete()
+        self.stdout.write(
+            json.dumps(
+                {
+                    "status": response.status_code,
+                    "elapsed": self.samples["upload"][0],
+                    "queries": self.queries["upload"],
+                    "start_rss_kb": start_rss,
+                    "peak_rss_kb": peak_rss,
+                }
+            )
+        )
+
+    def report(self, cases):
+        width = max(len(name) for name in cases)
+        for name, case in cases.items():
+            extra = "".join(
+                f" {key}={case[key]}"
+                for key in ("peak_rss_kb", "rss_growth_kb", "payload_kb")
+                if key in case
+            )
+            self.stdout.write(
+                f"{name:<{width}}  {case['status']}  "
+                f"p50 {case['p50_ms']:8.2f} ms  p99 {case['p99_ms']:8.2f} ms  "
+                f"queries {case['queries']:3}{extra}"
+            )
+
+    def compare(self, cases, path, threshold):
+        with open(path, encoding="utf-8") as file:
+            baseline = json.load(file)["cases"]
+        regressions = []
+        for name, case in cases.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if case["queries"] > before["queries"]:
+                regressions.append(
+                    f"{name}: queries {before['queries']} -> {case['queries']}"
+                )
+            if (
+                case["p99_ms"] > before["p99_ms"] * threshold
+                and case["p99_ms"] - before["p99_ms"] > 1
+            ):
+                regressions.append(
+                    f"{name}: p99 {before['p99_ms']} -> {case['p99_ms']} ms"
+                )
+        for line in regressions:
+            self.stderr.write(line)
+        if regressions:
+            raise CommandError(f"{len(regressions)} regressions against {path}")
+        self.stdout.write(f"No regressions against {path}.")
@@ -0,0 +1,102 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import DatabaseError, connections
+from django.db.backends.signals import connection_created
+from recipes.management.commands.loadtest import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request database overhead with the configured "
+        "connection mode and with a new connection per request; "
+        "run it with DB_POOL_MODE=pool to measure the in-process pool"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--threads", type=int, default=1,
+            help="Concurrent request threads, more than DB_POOL_MAX for a burst",
+        )
+        parser.add_argument(
+            "--hold", type=float, default=0,
+            help="Seconds each request keeps its connection",
+        )
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        connection = connections[alias]
+        mode = settings.DB_POOL_MODE
+        configured = connection.settings_dict["CONN_MAX_AGE"]
+        runs = [(f"configured ({mode}, CONN_MAX_AGE={configured})", configured)]
+        if configured != 0 and mode != "pool":
+            runs.append(("new connection per request", 0))
+        try:
+            for label, max_age in runs:
+                connection.close()
+                connection.settings_dict["CONN_MAX_AGE"] = max_age
+                self.run(label, alias, options)
+        finally:
+            connection.settings_dict["CONN_MAX_AGE"] = configured
+            connection.close()
+
+    def run(self, label, alias, options):
+        opened = set()
+        timings = []
+        errors = []
+
+        def count(sender, connection, **kwargs):
+            # В режиме pool connection_created срабатывает на каждую выдачу
+            # из пула, поэтому считаются разные серверные процессы.
+            raw = connection.connection
+            opened.add(
+                raw.get_backend_pid() if hasattr(raw, "get_backend_pid") else object()
+            )
+
+        def worker(requests):
+            connection = connections[alias]
+            for _ in range(requests):
+                started = time.perf_counter()
+                request_started.send(sender=self.__class__)
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                        cursor.fetchone()
+                    time.sleep(options["hold"])
+                except DatabaseError as error:
+                    errors.append(error)
+                finally:
+                    request_finished.send(sender=self.__class__)
+                timings.append(time.perf_counter() - started)
+            connection.close()
+
+        threads = [
+            threading.Thread(
+                target=worker, args=(options["requests"] // options["threads"],)
+            )
+            for _ in range(options["threads"])
+        ]
+        connection_created.connect(count)
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            connection_created.disconnect(count)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{label}: p50 {percentile(timings, 0.5) * 1000:.2f} ms, "
+            f"p99 {percentile(timings, 0.99) * 1000:.2f} ms, "
+            f"{len(timings) / elapsed:.0f} requests/s, "
+            f"{len(opened)} connections for {len(timings)} requests, "
+            f"{len(errors)} errors"
+        )
+        if errors:
+            self.stderr.write(f"First error: {errors[0]}")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from recipes.images import build_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Build resized copies of recipe images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Rebuild copies for recipes that already have them",
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="")
+        if not options["all"]:
+            recipes = recipes.filter(image_renditions={})
+        built = 0
+        for recipe_id, name in recipes.values_list("pk", "image").iterator():
+            build_renditions(recipe_id, name)
+            built += 1
+        self.stdout.write(f"Renditions built for {built} recipes.")
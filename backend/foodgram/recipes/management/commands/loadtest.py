@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+DEFAULT_PATHS = (
+    "/api/tags/",
+    "/api/ingredients/?name=с",
+    "/api/recipes/?limit=6",
+)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a running server with concurrent GET requests "
+        "to compare WSGI and ASGI deployments"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument(
+            "--path", action="append", dest="paths",
+            help="Path to request (can be repeated)",
+        )
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--token", help="Send Authorization: Token <token>")
+
+    def fetch(self, url, headers):
+        started = time.perf_counter()
+        try:
+            with urlopen(Request(url, headers=headers), timeout=30) as response:
+                response.read()
+                status = response.status
+        except HTTPError as exc:
+            status = exc.code
+        return time.perf_counter() - started, status
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options["token"]:
+            headers["Authorization"] = f"Token {options['token']}"
+        total = options["requests"]
+        for path in options["paths"] or DEFAULT_PATHS:
+            url = options["url"].rstrip("/") + path
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options["concurrency"]) as executor:
+                results = list(
+                    executor.map(
+                        lambda _: self.fetch(url, headers), range(total)
+                    )
+                )
+            elapsed = time.perf_counter() - started
+            timings = [timing for timing, _ in results]
+            errors = sum(1 for _, status in results if status >= 400)
+            self.stdout.write(
+                f"{path}: {total / elapsed:.0f} req/s, "
+                f"p50 {percentile(timings, 0.5) * 1000:.1f} ms, "
+                f"p99 {percentile(timings, 0.99) * 1000:.1f} ms, "
+                f"errors {errors}"
+            )
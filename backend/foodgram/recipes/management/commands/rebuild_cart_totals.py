@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify per-user shopping cart totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only compare stored totals with the shopping lists",
+        )
+        parser.add_argument(
+            "--user", type=int, action="append", dest="users",
+            help="Limit to the given user id (can be repeated)",
+        )
+
+    def handle(self, *args, **options):
+        users = options["users"]
+        if options["verify"]:
+            self.verify(users)
+            return
+        with transaction.atomic():
+            ShoppingCartTotal.objects.rebuild(users)
+        self.stdout.write("Shopping cart totals rebuilt.")
+
+    def verify(self, users):
+        stored = ShoppingCartTotal.objects.all()
+        if users is not None:
+            stored = stored.filter(user_id__in=users)
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in stored.values_list(
+                "user_id", "ingredient_id", "amount"
+            ).iterator()
+        }
+        expected = {
+            (row["user_id"], row["ingredient_id"]): row["amount"]
+            for row in ShoppingCartTotal.objects.expected(users).iterator()
+        }
+        mismatched = {
+            key
+            for key in stored.keys() | expected.keys()
+            if stored.get(key) != expected.get(key)
+        }
+        if mismatched:
+            raise CommandError(
+                f"{len(mismatched)} shopping cart totals are out of date, "
+                "run rebuild_cart_totals to fix them."
+            )
+        self.stdout.write("Shopping cart totals are up to date.")
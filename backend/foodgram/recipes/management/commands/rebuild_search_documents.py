@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe, refresh_search_documents
+
+
+class Command(BaseCommand):
+    help = "Recalculate Recipe.search_document from names, texts and ingredients"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = refresh_search_documents(
+            Recipe.objects.all(), options["batch_size"]
+        )
+        from api import feed_cache
+        feed_cache.invalidate("recipes")
+        self.stdout.write(f"{updated} search documents rebuilt.")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe
+
+
+class Command(BaseCommand):
+    help = "Recalculate Recipe.favorites_count from the Favorite table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report recipes with a wrong counter",
+        )
+
+    def handle(self, *args, **options):
+        favorites = (
+            Favorite.objects.filter(recipe=OuterRef("pk"))
+            .values("recipe")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        mismatched = [
+            Recipe(pk=pk, favorites_count=actual)
+            for pk, actual in Recipe.objects.annotate(
+                actual=Coalesce(Subquery(favorites), 0)
+            )
+            .exclude(favorites_count=F("actual"))
+            .values_list("pk", "actual")
+            .iterator()
+        ]
+        if not options["dry_run"]:
+            Recipe.objects.bulk_update(
+                mismatched, ["favorites_count"], batch_size=1000
+            )
+        self.stdout.write(
+            f"{len(mismatched)} recipes had a wrong favorites_count"
+            f"{'' if options['dry_run'] else ' and were fixed'}."
+        )
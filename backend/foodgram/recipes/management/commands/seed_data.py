@@ -0,0 +1,240 @@
+import io
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from PIL import Image
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredRecipe,
+    Recipe,
+    ShoppingCartTotal,
+    ShoppingList,
+    Tag,
+    search_document,
+)
+from users.models import Subscribe, User
+
+TAGS = (
+    ("Завтрак", "breakfast", "#E26C2D"),
+    ("Обед", "lunch", "#49B64E"),
+    ("Ужин", "dinner", "#8775D2"),
+    ("Десерт", "dessert", "#F2C94C"),
+    ("Суп", "soup", "#2D9CDB"),
+)
+
+IMAGE_NAME = "recipes/images/seed.jpg"
+
+
+def new_ids(model, last_id):
+    return list(
+        model.objects.filter(pk__gt=last_id or 0)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a reproducible synthetic dataset: users, recipes, favorites, "
+        "shopping carts and subscriptions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--recipes", type=int, default=1000)
+        parser.add_argument(
+            "--min-ingredients", type=int, default=3,
+            help="Minimum ingredients per recipe",
+        )
+        parser.add_argument(
+            "--max-ingredients", type=int, default=15,
+            help="Maximum ingredients per recipe",
+        )
+        parser.add_argument(
+            "--favorites", type=int, default=20,
+            help="Favorite recipes per user",
+        )
+        parser.add_argument(
+            "--cart", type=int, default=5, help="Recipes in each shopping cart"
+        )
+        parser.add_argument(
+            "--subscriptions", type=int, default=10,
+            help="Subscribed authors per user",
+        )
+        parser.add_argument(
+            "--ingredients", type=int, default=0,
+            help="Pad the ingredient table with synthetic rows up to this size",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options["min_ingredients"] > options["max_ingredients"]:
+            raise CommandError("--min-ingredients is greater than --max-ingredients")
+        if options["users"] < 1:
+            raise CommandError("--users must be positive")
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        started = time.monotonic()
+        if not Ingredient.objects.exists():
+            call_command("upload_ing", stdout=self.stdout)
+        with transaction.atomic():
+            self.pad_ingredients(options["ingredients"])
+            tag_ids = self.seed_tags()
+            user_ids = self.seed_users(options["users"])
+            recipe_ids = self.seed_recipes(
+                user_ids,
+                tag_ids,
+                options["recipes"],
+                options["min_ingredients"],
+                options["max_ingredients"],
+            )
+            self.seed_relations(
+                Favorite, user_ids, recipe_ids, options["favorites"], "recipe_id"
+            )
+            self.seed_relations(
+                ShoppingList, user_ids, recipe_ids, options["cart"], "recipe_id"
+            )
+            self.seed_relations(
+                Subscribe, user_ids, user_ids, options["subscriptions"], "author_id"
+            )
+            call_command("reconcile_favorites_count", stdout=io.StringIO())
+            ShoppingCartTotal.objects.rebuild(user_ids)
+        from api import feed_cache
+        from api.catalogue import ingredient_catalogue, tag_catalogue
+        ingredient_catalogue.bump()
+        tag_catalogue.bump()
+        feed_cache.invalidate("recipes")
+        self.stdout.write(
+            f"Seeded {len(user_ids)} users and {len(recipe_ids)} recipes "
+            f"in {time.monotonic() - started:.2f}s."
+        )
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def pad_ingredients(self, size):
+        missing = size - Ingredient.objects.count()
+        if missing <= 0:
+            return
+        base = list(Ingredient.objects.values_list("name", "measurement_unit"))
+        self.bulk_create(
+            Ingredient,
+            (
+                Ingredient(name=f"{name} {number}", measurement_unit=unit)
+                for number, (name, unit) in enumerate(
+                    (self.random.choice(base) for _ in range(missing)), 1
+                )
+            ),
+        )
+
+    def seed_tags(self):
+        for name, slug, color in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={"name": name, "color": color}
+            )
+        return list(Tag.objects.values_list("pk", flat=True))
+
+    def seed_users(self, count):
+        last_id = User.objects.aggregate(last=Max("pk"))["last"]
+        offset = User.objects.count()
+        password = make_password("seed-password")
+        self.bulk_create(
+            User,
+            (
+                User(
+                    username=f"seed{offset + number}",
+                    email=f"seed{offset + number}@example.com",
+                    first_name="Seed",
+                    last_name=str(offset + number),
+                    password=password,
+                )
+                for number in range(count)
+            ),
+        )
+        return new_ids(User, last_id)
+
+    def seed_recipes(self, user_ids, tag_ids, count, low, high):
+        ingredients = dict(Ingredient.objects.values_list("pk", "name"))
+        ingredient_ids = list(ingredients)
+        high = min(high, len(ingredient_ids))
+        contents = [
+            self.random.sample(
+                ingredient_ids, self.random.randint(min(low, high), high)
+            )
+            for _ in range(count)
+        ]
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = io.BytesIO()
+            Image.new("RGB", (1200, 800), "#E26C2D").save(buffer, "JPEG")
+            default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        last_id = Recipe.objects.aggregate(last=Max("pk"))["last"]
+        text = "Синтетический рецепт для нагрузочного тестирования."
+        self.bulk_create(
+            Recipe,
+            (
+                Recipe(
+                    author_id=self.random.choice(user_ids),
+                    name=f"Рецепт {number}",
+                    text=text,
+                    cooking_time=self.random.randint(5, 180),
+                    image=IMAGE_NAME,
+                    search_document=search_document(
+                        f"Рецепт {number}",
+                        text,
+                        [ingredients[pk] for pk in contents[number]],
+                    ),
+                )
+                for number in range(count)
+            ),
+        )
+        recipe_ids = new_ids(Recipe, last_id)
+        self.seed_recipe_rows(recipe_ids, tag_ids, contents)
+        return recipe_ids
+
+    def seed_recipe_rows(self, recipe_ids, tag_ids, contents):
+        through = Recipe.tags.through
+        self.bulk_create(
+            through,
+            (
+                through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.random.sample(
+                    tag_ids, self.random.randint(1, min(3, len(tag_ids)))
+                )
+            ),
+        )
+        self.bulk_create(
+            IngredRecipe,
+            (
+                IngredRecipe(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500),
+                )
+                for recipe_id, ingredient_ids in zip(recipe_ids, contents)
+                for ingredient_id in ingredient_ids
+            ),
+        )
+
+    def seed_relations(self, model, user_ids, target_ids, per_user, field):
+        objects = []
+        for user_id in user_ids:
+            targets = self.random.sample(
+                target_ids, min(per_user + 1, len(target_ids))
+            )
+            if field == "author_id":
+                targets = [pk for pk in targets if pk != user_id]
+            objects.extend(
+                model(user_id=user_id, **{field: target_id})
+                for target_id in targets[:per_user]
+            )
+        self.bulk_create(model, objects)
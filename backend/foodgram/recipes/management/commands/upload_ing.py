@@ -1,21 +1,94 @@
 import csv
+import io
 import os
+import time
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from recipes.models import Ingredient
 
 
 class Command(BaseCommand):
     help = "Load ingredients to DB"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default=os.path.join(settings.BASE_DIR, "data/ingredients.csv"),
+            help="CSV file with name,measurement_unit rows",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Number of rows inserted per query",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Parse the file and report new rows without writing them",
+        )
+        parser.add_argument(
+            "--truncate", action="store_true",
+            help="Delete all ingredients (and the recipe rows using them) first",
+        )
+
     def handle(self, *args, **options):
-        path = os.path.join(settings.BASE_DIR, 'data/ingredients.csv')
-        with open(path, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                Ingredient.objects.get_or_create(
-                    name=row[0],
-                    measurement_unit=row[1])
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        started = time.monotonic()
+        with transaction.atomic():
+            if options["truncate"]:
+                if not options["dry_run"]:
+                    Ingredient.objects.all().delete()
+                seen = set()
+            else:
+                seen = set(
+                    Ingredient.objects.values_list("name", "measurement_unit")
+                )
+            read = created = 0
+            with open(options["path"], "r", encoding="utf-8") as file:
+                rows = csv.reader(file)
+                while True:
+                    chunk = list(islice(rows, options["batch_size"]))
+                    if not chunk:
+                        break
+                    read += len(chunk)
+                    batch = []
+                    for row in chunk:
+                        pair = (row[0].strip(), row[1].strip())
+                        if pair not in seen:
+                            seen.add(pair)
+                            batch.append(pair)
+                    created += len(batch)
+                    if batch and not options["dry_run"]:
+                        self.insert(batch)
+        elapsed = time.monotonic() - started
+        if created and not options["dry_run"]:
+            from api.catalogue import ingredient_catalogue
+            ingredient_catalogue.bump()
+        self.stdout.write(
+            f"{'Would upload' if options['dry_run'] else 'Uploaded'} "
+            f"{created} of {read} ingredients in {elapsed:.2f}s "
+            f"({read / elapsed if elapsed else read:.0f} rows/s)."
+        )
 
-        self.stdout.write("Engredients uploaded.")
+    def insert(self, batch):
+        if connection.vendor != "postgresql":
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, measurement_unit=unit) for name, unit in batch]
+            )
+            return
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        opts = Ingredient._meta
+        columns = ", ".join(
+            connection.ops.quote_name(opts.get_field(field).column)
+            for field in ("name", "measurement_unit")
+        )
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {connection.ops.quote_name(opts.db_table)} ({columns}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.18 on 2026-10-18 16:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import F, Sum
+
+
+def fill_cart_totals(apps, schema_editor):
+    ShoppingList = apps.get_model('recipes', 'ShoppingList')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    totals = ShoppingList.objects.filter(
+        recipe__recipe__isnull=False
+    ).values(
+        'user_id', ingredient_id=F('recipe__recipe__ingredient_id')
+    ).annotate(amount=Sum('recipe__recipe__amount'))
+    ShoppingCartTotal.objects.bulk_create(
+        [ShoppingCartTotal(**row) for row in totals.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0018_alter_ingredrecipe_amount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_totals', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcarttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='Неравные итоги корзины'),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
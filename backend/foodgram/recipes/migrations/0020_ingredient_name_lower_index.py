@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    opclass = ''
+    if schema_editor.connection.vendor == 'postgresql':
+        opclass = ' text_pattern_ops'
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_lower_idx '
+        f'ON recipes_ingredient (LOWER(name){opclass})'
+    )
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS recipes_ingredient_name_lower_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_shoppingcarttotal'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.18 on 2026-10-18 16:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_favorites_count(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    favorites = Favorite.objects.filter(recipe=OuterRef('pk')).values(
+        'recipe'
+    ).annotate(count=Count('id')).values('count')
+    Recipe.objects.update(favorites_count=Coalesce(Subquery(favorites), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0022_recipe_pub_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.RunPython(fill_favorites_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-pub_date'], name='recipe_fav_count_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:05
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Q, Sum
+
+BATCH_SIZE = 1000
+
+
+def deduplicate_shopping_list(apps, schema_editor):
+    ShoppingList = apps.get_model('recipes', 'ShoppingList')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    duplicates = ShoppingList.objects.values('user_id', 'recipe_id').annotate(
+        keep=Min('id'), count=Count('id')
+    ).filter(count__gt=1).order_by('user_id', 'recipe_id')
+    users = set()
+    while True:
+        batch = list(duplicates[:BATCH_SIZE])
+        if not batch:
+            break
+        groups = Q()
+        for row in batch:
+            groups |= Q(user_id=row['user_id'], recipe_id=row['recipe_id'])
+            users.add(row['user_id'])
+        ShoppingList.objects.filter(groups).exclude(
+            id__in=[row['keep'] for row in batch]
+        ).delete()
+    users = sorted(users)
+    for start in range(0, len(users), BATCH_SIZE):
+        chunk = users[start:start + BATCH_SIZE]
+        ShoppingCartTotal.objects.filter(user_id__in=chunk).delete()
+        totals = ShoppingList.objects.filter(
+            user_id__in=chunk, recipe__recipe__isnull=False
+        ).values(
+            'user_id', ingredient_id=F('recipe__recipe__ingredient_id')
+        ).annotate(amount=Sum('recipe__recipe__amount'))
+        ShoppingCartTotal.objects.bulk_create(
+            [ShoppingCartTotal(**row) for row in totals.iterator()],
+            batch_size=BATCH_SIZE,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0024_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_shopping_list, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='shoppinglist',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='Неравные корзины'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=models.Index(fields=['recipe', 'user'], name='shoppinglist_recipe_user_idx'),
+        ),
+    ]
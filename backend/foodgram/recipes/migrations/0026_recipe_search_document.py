@@ -0,0 +1,58 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:40
+
+from django.db import migrations, models
+from django.db.models import Prefetch
+
+BATCH_SIZE = 1000
+
+
+def fill_search_document(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    recipes = Recipe.objects.only('id', 'name', 'text').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(
+            recipes.filter(id__gt=last_id).prefetch_related(
+                Prefetch('ingredients', queryset=Ingredient.objects.only('name'))
+            )[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for recipe in batch:
+            recipe.search_document = ' '.join(
+                [recipe.name, recipe.text]
+                + [ingredient.name for ingredient in recipe.ingredients.all()]
+            )
+        Recipe.objects.bulk_update(batch, ['search_document'])
+        last_id = batch[-1].id
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_recipe_search_idx ON recipes_recipe '
+        "USING GIN (to_tsvector('russian'::regconfig, search_document))"
+    )
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS recipes_recipe_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0025_shoppinglist_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Текст для поиска'),
+        ),
+        migrations.RunPython(fill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_index, drop_index),
+    ]
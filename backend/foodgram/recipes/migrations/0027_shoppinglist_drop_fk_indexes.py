@@ -0,0 +1,26 @@
+# Generated by Django 3.2.18 on 2026-10-18 17:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0026_recipe_search_document'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shoppinglist',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipe_basket', to='recipes.recipe', verbose_name='Рецепт в корзине'),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglist',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='user_basket', to=settings.AUTH_USER_MODEL, verbose_name='Добавлено в корзину'),
+        ),
+    ]
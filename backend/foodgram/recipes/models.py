@@ -1,5 +1,8 @@
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
 from users.models import User
 
@@ -39,6 +42,34 @@ class Tag(models.Model):
         return self.name
 
 
+def search_document(name, text, ingredient_names):
+    """Название, описание и названия ингредиентов рецепта одной строкой."""
+    return " ".join([name, text, *ingredient_names])
+
+
+def refresh_search_documents(recipes, batch_size=1000):
+    """Пересчитывает search_document рецептов из queryset, возвращает их число."""
+    recipes = recipes.only("id", "name", "text").order_by("id").prefetch_related(
+        models.Prefetch("ingredients", queryset=Ingredient.objects.only("name"))
+    )
+    now = timezone.now()
+    last_id = updated = 0
+    while True:
+        batch = list(recipes.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return updated
+        for recipe in batch:
+            recipe.search_document = search_document(
+                recipe.name,
+                recipe.text,
+                [ingredient.name for ingredient in recipe.ingredients.all()],
+            )
+            recipe.updated_at = now
+        Recipe.objects.bulk_update(batch, ["search_document", "updated_at"])
+        updated += len(batch)
+        last_id = batch[-1].id
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="recipes", verbose_name="Автор"
@@ -50,6 +81,13 @@ class Recipe(models.Model):
         verbose_name="Изображение", upload_to="recipes/images/", blank=True
     )
 
+    image_renditions = models.JSONField(
+        verbose_name="Уменьшенные копии изображения",
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+
     text = models.TextField(verbose_name="Описание")
 
     tags = models.ManyToManyField(Tag, verbose_name="Тег")
@@ -64,8 +102,24 @@ class Recipe(models.Model):
 
     pub_date = models.DateTimeField(verbose_name="Дата публикации", auto_now_add=True)
 
+    updated_at = models.DateTimeField(verbose_name="Дата изменения", auto_now=True)
+
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="Добавлений в избранное", default=0, editable=False
+    )
+
+    search_document = models.TextField(
+        verbose_name="Текст для поиска", blank=True, default="", editable=False
+    )
+
     class Meta:
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"], name="recipe_pub_date_id_idx"),
+            models.Index(
+                fields=["-favorites_count", "-pub_date"], name="recipe_fav_count_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -129,6 +183,7 @@ class ShoppingList(models.Model):
         User,
         related_name="user_basket",
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name="Добавлено в корзину",
     )
 
@@ -136,8 +191,126 @@ class ShoppingList(models.Model):
         Recipe,
         related_name="recipe_basket",
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name="Рецепт в корзине",
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="Неравные корзины"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["recipe", "user"], name="shoppinglist_recipe_user_idx"
+            )
+        ]
+
     def __str__(self):
         return f"{self.user.username}, {self.recipe.name}"
+
+
+class ShoppingCartTotalManager(models.Manager):
+    def add_recipe(self, users, recipe):
+        self._apply(users, self._recipe_amounts(recipe, 1))
+
+    def remove_recipe(self, users, recipe):
+        self._apply(users, self._recipe_amounts(recipe, -1))
+
+    def change_recipe(self, recipe, deltas):
+        """Переносит изменение состава рецепта в корзины, где он лежит."""
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if deltas:
+            self._apply(
+                ShoppingList.objects.filter(recipe=recipe).values_list(
+                    "user_id", flat=True
+                ),
+                deltas,
+            )
+
+    def _recipe_amounts(self, recipe, sign):
+        return {
+            ingredient_id: amount * sign
+            for ingredient_id, amount in IngredRecipe.objects.filter(
+                recipe=recipe
+            ).values_list("ingredient_id", "amount")
+        }
+
+    def _apply(self, users, deltas):
+        """Сдвигает итоги пользователей одним UPDATE на ингредиент-дельты."""
+        users = set(users)
+        if not users or not deltas:
+            return
+        added = [pk for pk, delta in deltas.items() if delta > 0]
+        if added:
+            self.bulk_create(
+                [
+                    self.model(user_id=user_id, ingredient_id=ingredient_id)
+                    for user_id in users
+                    for ingredient_id in added
+                ],
+                ignore_conflicts=True,
+            )
+        delta = Case(
+            *[
+                When(ingredient_id=ingredient_id, then=Value(delta))
+                for ingredient_id, delta in deltas.items()
+            ],
+            output_field=models.IntegerField(),
+        )
+        self.filter(user_id__in=users, ingredient_id__in=deltas).update(
+            amount=Greatest(F("amount") + delta, 0)
+        )
+        if len(added) < len(deltas):
+            self.filter(
+                user_id__in=users, ingredient_id__in=deltas, amount=0
+            ).delete()
+
+    def expected(self, users=None):
+        queryset = ShoppingList.objects.filter(recipe__recipe__isnull=False)
+        if users is not None:
+            queryset = queryset.filter(user_id__in=users)
+        return queryset.values(
+            "user_id", ingredient_id=F("recipe__recipe__ingredient_id")
+        ).annotate(amount=Sum("recipe__recipe__amount"))
+
+    def rebuild(self, users=None):
+        queryset = self.all()
+        if users is not None:
+            queryset = queryset.filter(user_id__in=users)
+        queryset.delete()
+        self.bulk_create(
+            [self.model(**row) for row in self.expected(users).iterator()],
+            batch_size=1000,
+        )
+
+
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        related_name="cart_totals",
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+    )
+
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name="cart_totals",
+        on_delete=models.CASCADE,
+        verbose_name="Ингредиент",
+    )
+
+    amount = models.PositiveIntegerField(default=0, verbose_name="Количество")
+
+    objects = ShoppingCartTotalManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"], name="Неравные итоги корзины"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}, {self.ingredient}, {self.amount}"
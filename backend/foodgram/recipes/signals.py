@@ -0,0 +1,111 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from foodgram.db.transaction import on_commit_once
+from recipes.models import (
+    Favorite,
+    IngredRecipe,
+    Recipe,
+    ShoppingCartTotal,
+    ShoppingList,
+    refresh_search_documents,
+)
+from users.models import Subscribe
+
+
+def change_favorites_count(recipe_id, delta):
+    Recipe.objects.filter(pk=recipe_id).update(
+        favorites_count=Greatest(F("favorites_count") + delta, 0)
+    )
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingList)
+@receiver(pre_save, sender=IngredRecipe)
+@receiver(pre_save, sender=Subscribe)
+def remember_previous_row(sender, instance, raw=False, **kwargs):
+    """Запоминает сохранённую строку, чтобы вычесть её из счётчиков."""
+    instance.previous_row = None
+    if not raw and not instance._state.adding:
+        instance.previous_row = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_cart_totals(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "previous_row", None)
+    if previous is not None:
+        ShoppingCartTotal.objects.remove_recipe(
+            [previous.user_id], previous.recipe_id
+        )
+    ShoppingCartTotal.objects.add_recipe([instance.user_id], instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingList)
+def remove_cart_totals(sender, instance, **kwargs):
+    ShoppingCartTotal.objects.remove_recipe([instance.user_id], instance.recipe_id)
+
+
+@receiver(post_save, sender=IngredRecipe)
+def change_cart_totals(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "previous_row", None)
+    if previous is not None:
+        ShoppingCartTotal.objects.change_recipe(
+            previous.recipe_id, {previous.ingredient_id: -previous.amount}
+        )
+    ShoppingCartTotal.objects.change_recipe(
+        instance.recipe_id, {instance.ingredient_id: instance.amount}
+    )
+
+
+@receiver(post_delete, sender=IngredRecipe)
+def remove_ingredient_cart_totals(sender, instance, **kwargs):
+    ShoppingCartTotal.objects.change_recipe(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
+
+
+@receiver(post_save, sender=Favorite)
+def count_favorite(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "previous_row", None)
+    if previous is not None:
+        change_favorites_count(previous.recipe_id, -1)
+    change_favorites_count(instance.recipe_id, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def uncount_favorite(sender, instance, **kwargs):
+    change_favorites_count(instance.recipe_id, -1)
+
+
+def schedule_search_document(recipe_id):
+    """Пересчёт после коммита: к этому моменту состав рецепта уже сохранён."""
+    on_commit_once(
+        ("search_document", recipe_id),
+        lambda: refresh_search_documents(Recipe.objects.filter(pk=recipe_id)),
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_recipe_search_document(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_search_document(instance.pk)
+
+
+@receiver(post_save, sender=IngredRecipe)
+@receiver(post_delete, sender=IngredRecipe)
+def refresh_ingredients_search_document(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "previous_row", None)
+    if previous is not None and previous.recipe_id != instance.recipe_id:
+        schedule_search_document(previous.recipe_id)
+    schedule_search_document(instance.recipe_id)